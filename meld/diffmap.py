@@ -131,15 +131,23 @@ class DiffMap(Gtk.DrawingArea):
             cache_ctx = cairo.Context(surface)
             cache_ctx.set_line_width(1)
 
-            tagged_diffs = collections.defaultdict(list)
+            # Chunks are bucketed into pixel rows, and overlapping or
+            # touching spans of the same type are merged, so that drawing
+            # cost depends on the map's height rather than the chunk count.
+            tagged_spans = collections.defaultdict(list)
             for c, y0, y1 in self._difffunc():
-                tagged_diffs[c].append((y0, y1))
-
-            for tag, diffs in tagged_diffs.items():
+                y0, y1 = round(y0 * height), round(y1 * height)
+                spans = tagged_spans[c]
+                if spans and y0 <= spans[-1][1]:
+                    if y1 > spans[-1][1]:
+                        spans[-1][1] = y1
+                else:
+                    spans.append([y0, y1])
+
+            for tag, spans in tagged_spans.items():
                 cache_ctx.set_source_rgba(*self.fill_colors[tag])
-                for y0, y1 in diffs:
-                    y0, y1 = round(y0 * height) - 0.5, round(y1 * height) - 0.5
-                    cache_ctx.rectangle(x0, y0, x1, y1 - y0)
+                for y0, y1 in spans:
+                    cache_ctx.rectangle(x0, y0 - 0.5, x1, y1 - y0)
                 cache_ctx.fill_preserve()
                 cache_ctx.set_source_rgba(*self.line_colors[tag])
                 cache_ctx.stroke()
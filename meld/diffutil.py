@@ -14,7 +14,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import GObject
+import bisect
+
+# Differ and Merger are also used for headless comparisons, which don't
+# need PyGObject; without it, differs just don't emit any signals.
+try:
+    from gi.repository import GObject
+except ImportError:
+    GObject = None
 
 from .matchers import DiffChunk, MyersSequenceMatcher, \
     SyncPointMyersSequenceMatcher
@@ -58,20 +65,31 @@ def consume_blank_lines(chunk, texts, pane1, pane2):
     return DiffChunk._make((tag, c1, c2, c3, c4))
 
 
-class Differ(GObject.GObject):
-    """Utility class to hold diff2 or diff3 chunks"""
+if GObject is not None:
+    class DifferSignals(GObject.GObject):
+        """Signals emitted by differs as their chunks change"""
+
+        __gsignals__ = {
+            'diffs-changed': (GObject.SignalFlags.RUN_FIRST, None,
+                                                        (object,)),
+        }
+else:
+    class DifferSignals(object):
+        """Stand-in for differ signals where PyGObject isn't available"""
+
+        def emit(self, signal, *args):
+            pass
 
-    __gsignals__ = {
-        'diffs-changed': (GObject.SignalFlags.RUN_FIRST, None,
-                                                    (object,)),
-    }
+
+class Differ(DifferSignals):
+    """Utility class to hold diff2 or diff3 chunks"""
 
     _matcher = MyersSequenceMatcher
     _sync_matcher = SyncPointMyersSequenceMatcher
 
     def __init__(self):
         # Internally, diffs are stored from text1 -> text0 and text1 -> text2.
-        GObject.GObject.__init__(self)
+        DifferSignals.__init__(self)
         self.num_sequences = 0
         self.seqlength = [0, 0, 0]
         self.diffs = [[], []]
@@ -81,6 +99,7 @@ class Differ(GObject.GObject):
         self._changed_chunks = tuple()
         self._merge_cache = []
         self._line_cache = [[], [], []]
+        self._pair_cache = {}
         self.ignore_blanks = False
         self._initialised = False
         self._has_mergeable_changes = (False, False, False, False)
@@ -130,6 +149,7 @@ class Differ(GObject.GObject):
                 self.conflicts.append(i)
 
         self._update_line_cache()
+        self._pair_cache = {}
         self.emit("diffs-changed", chunk_changes)
 
     def _update_line_cache(self):
@@ -322,6 +342,34 @@ class Differ(GObject.GObject):
     def all_changes(self):
         return iter(self._merge_cache)
 
+    def _get_pair_cache(self, fromindex, toindex):
+        """Get the changes between two files and their end lines
+
+        The list of changes and the list of the changes' end lines in
+        fromindex are built on first use and kept until the diffs change.
+        """
+        try:
+            return self._pair_cache[(fromindex, toindex)]
+        except KeyError:
+            changes = list(self._iter_pair_changes(fromindex, toindex,
+                                                   self._merge_cache))
+            pair_cache = (changes, [c[2] for c in changes])
+            self._pair_cache[(fromindex, toindex)] = pair_cache
+            return pair_cache
+
+    def locate_pair_change(self, fromindex, toindex, line):
+        """Find the changes between two files on either side of line
+
+        Returns a tuple of the last change that ends before line in
+        fromindex, and the first change that contains or follows line.
+        Either may be None if there is no such change.
+        """
+        changes, ends = self._get_pair_cache(fromindex, toindex)
+        index = bisect.bisect_left(ends, line)
+        previous = changes[index - 1] if index > 0 else None
+        current = changes[index] if index < len(changes) else None
+        return previous, current
+
     def pair_changes(self, fromindex, toindex, lines=(None, None, None, None)):
         """Give all changes between file1 and either file0 or file2.
         """
@@ -330,13 +378,15 @@ class Differ(GObject.GObject):
             start2, end2 = self._range_from_lines(toindex, lines[2:4])
             if (start1 is None or end1 is None) and \
                (start2 is None or end2 is None):
-                return
+                return iter([])
             start = min([x for x in (start1, start2) if x is not None])
             end = max([x for x in (end1, end2) if x is not None])
             merge_cache = self._merge_cache[start:end + 1]
+            return self._iter_pair_changes(fromindex, toindex, merge_cache)
         else:
-            merge_cache = self._merge_cache
+            return iter(self._get_pair_cache(fromindex, toindex)[0])
 
+    def _iter_pair_changes(self, fromindex, toindex, merge_cache):
         if fromindex == 1:
             seq = toindex // 2
             for c in merge_cache:
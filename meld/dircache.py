@@ -0,0 +1,263 @@
+# Copyright (C) 2014 Kai Willadsen <kai.willadsen@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Persistent storage for folder comparison results
+
+Comparison results are keyed by the compared paths and the active text
+filters, and are stored along with the stat details of the files at the
+time of comparison. A stored result is only valid if the files' current
+stat details match, so the cache never needs explicit invalidation.
+
+Recently used results are kept in a bounded in-memory cache. Results are
+also written to an SQLite database so that they survive between sessions;
+the database is pruned to a fixed number of entries, dropping the least
+recently used.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+log = logging.getLogger(__name__)
+
+
+def cache_key_digest(key):
+    """Get a stable digest for a (files, regexes, ignore_blanks) key"""
+    files, regexes, ignore_blank_lines = key
+    patterns = tuple((r.pattern, r.flags) for r in regexes)
+    return hashlib.sha1(
+        repr((files, patterns, bool(ignore_blank_lines)))).hexdigest()
+
+
+class ComparisonCache(object):
+    """Bounded comparison result cache with an optional on-disk store
+
+    The cache is used like a dictionary, with get() and item assignment.
+    Values are (stats, result) pairs, and are returned as instances of
+    the value_type given on construction.
+
+    The database is only used from the process that created the cache;
+    worker processes see a purely in-memory cache. Looking up stored
+    results one at a time would serialise comparison threads on the
+    database, so callers should preload() the keys of a batch of
+    comparisons before starting them.
+    """
+
+    # Number of pending results at which they're written out mid-scan
+    flush_threshold = 10000
+    # Number of keys looked up by each query when preloading
+    preload_batch_size = 500
+
+    def __init__(self, path, value_type, stat_type, max_entries=100000,
+                 max_stored_entries=1000000):
+        self.path = path
+        self.value_type = value_type
+        self.stat_type = stat_type
+        self.max_entries = max_entries
+        self.max_stored_entries = max_stored_entries
+        self.entries = collections.OrderedDict()
+        self.pending = {}
+        self.lock = threading.RLock()
+        # Database access has its own lock, so that in-memory lookups
+        # aren't held up by queries.
+        self.db_lock = threading.Lock()
+        # Keys not found in the database by the last preload
+        self.absent = set()
+        self._db = None
+        self._db_failed = path is None or sqlite3 is None
+        self._pid = os.getpid()
+        self._pruned = False
+
+    def disable_storage(self):
+        """Stop using the database, as in worker processes"""
+        self._db_failed = True
+
+    def _uses_db(self):
+        return not self._db_failed and os.getpid() == self._pid
+
+    def _get_db(self):
+        # Must be called with db_lock held
+        if not self._uses_db():
+            return None
+        if self._db is None:
+            try:
+                dirname = os.path.dirname(self.path)
+                if not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                db = sqlite3.connect(self.path, check_same_thread=False)
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS comparisons ("
+                    "key TEXT PRIMARY KEY, stats TEXT, result INTEGER, "
+                    "used REAL)")
+                db.execute(
+                    "CREATE INDEX IF NOT EXISTS comparisons_used "
+                    "ON comparisons (used)")
+                db.commit()
+            except (OSError, sqlite3.Error) as e:
+                log.warning("Couldn't open comparison cache %s: %s",
+                            self.path, e)
+                self._db_failed = True
+                return None
+            self._db = db
+        return self._db
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _stored_value(self, key, stats, result):
+        # Must be called with lock held
+        stats = tuple(self.stat_type(*s) for s in json.loads(stats))
+        value = self.value_type(stats, result)
+        self._remember(key, value)
+        # Rewriting the entry on flush marks it as recently used
+        self.pending[key] = value
+        return value
+
+    def preload(self, keys):
+        """Load any stored results for keys from the database at once
+
+        Keys that aren't found are remembered until the next preload, so
+        that looking them up doesn't query the database again.
+        """
+        if not self._uses_db():
+            return
+        with self.lock:
+            digests = dict((cache_key_digest(k), k) for k in keys
+                           if k not in self.entries)
+        if not digests:
+            return
+
+        rows = []
+        with self.db_lock:
+            db = self._get_db()
+            if db is None:
+                return
+            batch = list(digests)
+            try:
+                for start in range(0, len(batch), self.preload_batch_size):
+                    chunk = batch[start:start + self.preload_batch_size]
+                    rows.extend(db.execute(
+                        "SELECT key, stats, result FROM comparisons "
+                        "WHERE key IN (%s)" % ",".join("?" * len(chunk)),
+                        chunk))
+            except sqlite3.Error as e:
+                log.warning("Couldn't read comparison cache: %s", e)
+                return
+
+        with self.lock:
+            absent = set(digests.values())
+            for digest, stats, result in rows:
+                key = digests[digest]
+                self._stored_value(key, stats, result)
+                absent.discard(key)
+            self.absent = absent
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.entries.pop(key, None)
+            if value is not None:
+                self.entries[key] = value
+                return value
+            if key in self.absent:
+                return default
+        if not self._uses_db():
+            return default
+
+        with self.db_lock:
+            db = self._get_db()
+            if db is None:
+                return default
+            try:
+                row = db.execute(
+                    "SELECT stats, result FROM comparisons WHERE key = ?",
+                    (cache_key_digest(key),)).fetchone()
+            except sqlite3.Error as e:
+                log.warning("Couldn't read comparison cache: %s", e)
+                return default
+        if row is None:
+            return default
+
+        with self.lock:
+            return self._stored_value(key, row[0], row[1])
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.absent.discard(key)
+            self._remember(key, value)
+            if not self._uses_db():
+                return
+            self.pending[key] = value
+            full = len(self.pending) >= self.flush_threshold
+        if full:
+            self.flush()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.pending.clear()
+            self.absent.clear()
+
+    def flush(self, prune=False):
+        """Write pending results to disk
+
+        If prune is true, stored results beyond max_stored_entries are
+        also dropped, least recently used first. This is slow on large
+        databases, so it's only done once per session.
+        """
+        prune = prune and not self._pruned
+        with self.lock:
+            if not self.pending and not prune:
+                return
+            now = time.time()
+            rows = [
+                (cache_key_digest(key), json.dumps(value.stats),
+                 value.result, now)
+                for key, value in self.pending.items()]
+            self.pending.clear()
+
+        with self.db_lock:
+            db = self._get_db()
+            if db is None:
+                return
+            try:
+                with db:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO comparisons "
+                        "(key, stats, result, used) VALUES (?, ?, ?, ?)",
+                        rows)
+                    if prune:
+                        db.execute(
+                            "DELETE FROM comparisons WHERE key IN ("
+                            "SELECT key FROM comparisons ORDER BY used DESC "
+                            "LIMIT -1 OFFSET ?)", (self.max_stored_entries,))
+                        self._pruned = True
+            except sqlite3.Error as e:
+                log.warning("Couldn't write comparison cache: %s", e)
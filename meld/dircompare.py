@@ -0,0 +1,929 @@
+# Copyright (C) 2002-2006 Stephen Kennedy <stevek@gnome.org>
+# Copyright (C) 2009-2014 Kai Willadsen <kai.willadsen@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Folder comparison engine
+
+This module holds the parts of folder comparison that don't need a user
+interface: listing folders, matching entries across panes and comparing
+files. DirDiff builds its tree from these, and compare_folders() uses
+them to compare folder trees headlessly, as for "meld --compare-dirs".
+"""
+
+from __future__ import print_function
+
+import errno
+import functools
+import hashlib
+import io
+import json
+import multiprocessing
+import operator
+import optparse
+import os
+import re
+import signal
+import stat
+import sys
+import threading
+
+from collections import namedtuple, OrderedDict
+from multiprocessing.pool import ThreadPool
+
+try:
+    scandir = os.scandir
+except AttributeError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+from . import dircache
+from . import filters
+
+
+class StatItem(namedtuple('StatItem', 'mode size time')):
+    """Stat details used to compare files, with mtimes in nanoseconds"""
+    __slots__ = ()
+
+    @classmethod
+    def _make(cls, stat_result):
+        return StatItem(stat.S_IFMT(stat_result.st_mode),
+                        stat_result.st_size, mtime_ns(stat_result))
+
+    def shallow_equal(self, other, time_resolution_ns):
+        if self.size != other.size:
+            return False
+
+        # 2 seconds is our current accuracy threshold (for VFAT), so
+        # anything further apart than that is definitely different.
+        if abs(self.time - other.time) > 2 * NS_PER_SECOND:
+            return False
+
+        mtime1 = self.time // time_resolution_ns
+        mtime2 = other.time // time_resolution_ns
+
+        return mtime1 == mtime2
+
+
+NS_PER_SECOND = 10 ** 9
+
+
+def mtime_ns(stat_result):
+    """Get the integer modification time in nanoseconds of a stat result"""
+    try:
+        return stat_result.st_mtime_ns
+    except AttributeError:
+        # Split off the whole seconds, so that rounding the fraction to
+        # nanoseconds loses as little precision as possible
+        mtime = stat_result.st_mtime
+        seconds = int(mtime // 1)
+        return seconds * NS_PER_SECOND + int(round((mtime - seconds) * 1e9))
+
+
+CacheResult = namedtuple('CacheResult', 'stats result')
+
+DirEntry = namedtuple('DirEntry', 'name stat error')
+
+
+def _user_cache_dir():
+    try:
+        from gi.repository import GLib
+    except ImportError:
+        return os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache")
+    return GLib.get_user_cache_dir()
+
+
+_cache = dircache.ComparisonCache(
+    os.path.join(_user_cache_dir(), "meld", "folder-comparisons.db"),
+    CacheResult, StatItem)
+
+Same, SameFiltered, DodgySame, DodgyDifferent, Different, FileError = \
+    list(range(6))
+# Block size used when reading files for filtered comparisons
+CHUNK_SIZE = 4096
+# Minimum block size used when comparing unfiltered file contents
+LARGE_CHUNK_SIZE = 1024 * 1024
+# Number of upcoming folders to list in the background while scanning
+PREFETCH_FOLDERS = 4
+
+posix_fadvise = getattr(os, "posix_fadvise", None)
+
+# Canonicalisation for case-insensitive name matching
+try:
+    casefold = str.casefold
+except AttributeError:
+    casefold = operator.methodcaller("lower")
+
+# Cache of path -> (stat signature, digest) for digest-based comparisons,
+# keeping the DIGEST_CACHE_SIZE most recently used digests
+DIGEST_CACHE_SIZE = 100000
+_digest_cache = OrderedDict()
+_digest_lock = threading.Lock()
+_digest_algorithm = getattr(hashlib, "blake2b", hashlib.sha1)
+
+
+def flush_cache():
+    """Write recent comparison results to the persistent cache
+
+    This should be called at the end of a scan; the stored results are
+    also pruned the first time it's called.
+    """
+    _cache.flush(prune=True)
+
+
+def all_same(lst):
+    return not lst or lst.count(lst[0]) == len(lst)
+
+
+def _read_block(handle, view):
+    """Fill view from handle, returning the number of bytes read"""
+    size = 0
+    while size < len(view):
+        read = handle.readinto(view[size:])
+        if not read:
+            break
+        size += read
+    return size
+
+
+def _contents_same(files, stat_results):
+    """Compare unfiltered file contents, returning Same or Different
+
+    Files are read in large blocks (a multiple of the filesystem's preferred
+    block size) into preallocated buffers, and compared without copying.
+    """
+    block_size = max([getattr(s, "st_blksize", 0) or CHUNK_SIZE
+                      for s in stat_results])
+    block_size *= max(1, LARGE_CHUNK_SIZE // block_size)
+    views = [memoryview(bytearray(block_size)) for f in files]
+
+    handles = []
+    try:
+        for f, s in zip(files, stat_results):
+            handle = io.open(f, "rb", buffering=0)
+            handles.append(handle)
+            if posix_fadvise and s.st_size > block_size:
+                try:
+                    posix_fadvise(handle.fileno(), 0, 0,
+                                  os.POSIX_FADV_SEQUENTIAL)
+                except OSError:
+                    pass
+
+        while True:
+            sizes = [_read_block(h, v) for h, v in zip(handles, views)]
+            if not all_same(sizes):
+                return Different
+            size = sizes[0]
+            if not size:
+                return Same
+            first = views[0][:size]
+            if any(v[:size] != first for v in views[1:]):
+                return Different
+    finally:
+        for h in handles:
+            h.close()
+
+
+def remove_blank_lines(text):
+    splits = text.splitlines()
+    lines = text.splitlines(True)
+    blanks = set([i for i, l in enumerate(splits) if not l])
+    lines = [l for i, l in enumerate(lines) if i not in blanks]
+    return ''.join(lines)
+
+
+def _filtered_chunks(handle, regexes, ignore_blank_lines):
+    """Yield the non-empty filtered text of each line in handle
+
+    As in file comparisons, filters are applied to each line on its own,
+    so only one line of each file is held in memory at a time.
+    """
+    for line in handle:
+        for r in regexes:
+            line = re.sub(r, "", line)
+        if ignore_blank_lines:
+            line = remove_blank_lines(line)
+        if line:
+            yield line
+
+
+def _streams_same(streams):
+    """Check whether iterables of strings have the same concatenation"""
+    pending = [""] * len(streams)
+    while True:
+        for i, stream in enumerate(streams):
+            if not pending[i]:
+                pending[i] = next(stream, "")
+        size = min(len(p) for p in pending)
+        if not size:
+            return not any(pending)
+        if not all_same([p[:size] for p in pending]):
+            return False
+        pending = [p[size:] for p in pending]
+
+
+def _scan_directory(root, name_filter=None):
+    """List a folder, along with the lstat() results of its entries
+
+    Returns a list of DirEntry tuples and a list of approximations of any
+    names that couldn't be decoded. For entries that couldn't be stat-ed,
+    stat is None and error is the resulting OSError. Names matched by
+    name_filter, a filters.NameFilterMatcher, are skipped without being
+    stat-ed.
+
+    Where scandir is available, we get entries' stat details from the
+    directory listing itself if the platform provides them.
+    """
+    if scandir is not None:
+        listing = [(e.name, e) for e in scandir(root)]
+    else:
+        listing = [(name, None) for name in os.listdir(root)]
+
+    if name_filter is not None:
+        match = name_filter.match
+        listing = [l for l in listing if not match(l[0])]
+
+    entries, invalid_names = [], []
+    for name, dir_entry in listing:
+        try:
+            if not isinstance(name, unicode):
+                name = name.decode('utf8')
+        except UnicodeDecodeError:
+            invalid_names.append(name.decode('utf8', 'replace'))
+            continue
+
+        try:
+            if dir_entry is not None:
+                s = dir_entry.stat(follow_symlinks=False)
+            else:
+                s = os.lstat(os.path.join(root, name))
+        except OSError as err:
+            entries.append(DirEntry(name, None, err))
+            continue
+        entries.append(DirEntry(name, s, None))
+    return entries, invalid_names
+
+
+def _file_digest(path, stat_result):
+    """Get a digest of the contents of path
+
+    Digests are cached, and reused for as long as the file's inode, size
+    and mtime are unchanged.
+    """
+    signature = (stat_result.st_ino, stat_result.st_size,
+                 mtime_ns(stat_result))
+    with _digest_lock:
+        cached = _digest_cache.pop(path, None)
+        if cached is not None:
+            _digest_cache[path] = cached
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    block_size = getattr(stat_result, "st_blksize", 0) or CHUNK_SIZE
+    block_size *= max(1, LARGE_CHUNK_SIZE // block_size)
+    view = memoryview(bytearray(block_size))
+    digest = _digest_algorithm()
+    with io.open(path, "rb", buffering=0) as handle:
+        if posix_fadvise and stat_result.st_size > block_size:
+            try:
+                posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        while True:
+            size = _read_block(handle, view)
+            if not size:
+                break
+            digest.update(view[:size])
+    digest = digest.digest()
+    with _digest_lock:
+        _digest_cache[path] = (signature, digest)
+        if len(_digest_cache) > DIGEST_CACHE_SIZE:
+            _digest_cache.popitem(last=False)
+    return digest
+
+
+def files_same(files, regexes, comparison_args, stat_results=None):
+    """Determine whether a list of files are the same.
+
+    Possible results are:
+      Same: The files are the same
+      SameFiltered: The files are identical only after filtering with 'regexes'
+      DodgySame: The files are superficially the same (i.e., type, size, mtime)
+      DodgyDifferent: The files are superficially different
+      FileError: There was a problem reading one or more of the files
+
+    If the caller already has stat results for the files, passing them as
+    stat_results avoids re-stat-ing each file.
+    """
+
+    # One file is the same as itself
+    if len(files) < 2:
+        return Same
+
+    files = tuple(files)
+    regexes = tuple(regexes)
+    if stat_results is None:
+        stat_results = [os.stat(f) for f in files]
+    stats = tuple([StatItem._make(s) for s in stat_results])
+
+    shallow_comparison = comparison_args['shallow-comparison']
+    digest_comparison = comparison_args['digest-comparison']
+    time_resolution_ns = comparison_args['time-resolution']
+    ignore_blank_lines = comparison_args['ignore_blank_lines']
+
+    need_contents = regexes or ignore_blank_lines
+
+    # If all entries are directories, they are considered to be the same
+    if all([stat.S_ISDIR(s.mode) for s in stats]):
+        return Same
+
+    # If any entries are not regular files, consider them different
+    if not all([stat.S_ISREG(s.mode) for s in stats]):
+        return Different
+
+    # Compare files superficially if the options tells us to
+    if shallow_comparison:
+        if all(s.shallow_equal(stats[0], time_resolution_ns) for s in stats[1:]):
+            return DodgySame
+        else:
+            return Different
+
+    # If there are no text filters, unequal sizes imply a difference
+    if not need_contents and not all_same([s.size for s in stats]):
+        return Different
+
+    # Check the cache before doing the expensive comparison
+    cache_key = (files, regexes, ignore_blank_lines)
+    cache = _cache.get(cache_key)
+    if cache and cache.stats == stats:
+        return cache.result
+
+    if not need_contents:
+        try:
+            if digest_comparison:
+                digests = [_file_digest(f, s)
+                           for f, s in zip(files, stat_results)]
+                result = Same if all_same(digests) else Different
+            else:
+                result = _contents_same(files, stat_results)
+        except (IOError, OSError):
+            # Don't cache generic errors as results
+            return FileError
+        _cache[cache_key] = CacheResult(stats, result)
+        return result
+
+    # Open files and compare bit-by-bit
+    result = None
+
+    try:
+        handles = [open(f, "rb") for f in files]
+        try:
+            data = [h.read(CHUNK_SIZE) for h in handles]
+
+            # Rough test to see whether files are binary. If files are guessed
+            # to be binary, we don't examine contents for speed and space.
+            if any(["\0" in d for d in data]):
+                need_contents = False
+
+            while True:
+                if all_same(data):
+                    if not data[0]:
+                        break
+                else:
+                    result = Different
+                    break
+
+                data = [h.read(CHUNK_SIZE) for h in handles]
+
+            if result == Different and need_contents:
+                for h in handles:
+                    h.seek(0)
+                filtered = [_filtered_chunks(h, regexes, ignore_blank_lines)
+                            for h in handles]
+                if _streams_same(filtered):
+                    result = SameFiltered
+
+        # Lines are too large; we can't apply filters
+        except (MemoryError, OverflowError):
+            result = DodgySame if all_same(stats) else DodgyDifferent
+        finally:
+            for h in handles:
+                h.close()
+    except IOError:
+        # Don't cache generic errors as results
+        return FileError
+
+    if result is None:
+        result = Same
+
+    _cache[cache_key] = CacheResult(stats, result)
+    return result
+
+
+def _scan_pane(root, name_filter):
+    """List a pane's folder, or return None if root isn't a folder"""
+    if not os.path.isdir(root):
+        return None
+    return _scan_directory(root, name_filter)
+
+
+def _init_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _cache.disable_storage()
+
+
+def _files_same_worker(files, regexes, comparison_args, stat_results=None,
+                       cache_entry=None):
+    """Compare files in a worker, returning the result and cache entry
+
+    Worker processes don't share our comparison cache, so the parent's
+    cache entry for the files is passed in, and the cache entry generated
+    by the comparison is returned for storing in the parent.
+    """
+    cache_key = (tuple(files), tuple(regexes),
+                 comparison_args['ignore_blank_lines'])
+    if cache_entry is not None:
+        _cache[cache_key] = cache_entry
+    try:
+        result = files_same(files, regexes, comparison_args, stat_results)
+    except (OSError, IOError):
+        return FileError, None
+    return result, _cache.get(cache_key)
+
+
+class ComparisonPool(object):
+    """Worker pools for comparing batches of files concurrently
+
+    Unfiltered comparisons are I/O-bound and run in a thread pool, while
+    filtered comparisons spend most of their time in regex substitution and
+    run in a process pool where one can be started safely. Comparison results are stored in
+    the comparison cache, from which later comparisons read them.
+    """
+
+    thread_pool = None
+    process_pool = None
+
+    def __init__(self):
+        if self.thread_pool is None:
+            try:
+                threads = max(4, multiprocessing.cpu_count())
+            except NotImplementedError:
+                threads = 4
+            ComparisonPool.thread_pool = ThreadPool(threads)
+
+    def _get_process_pool(self):
+        if self.process_pool is None:
+            # We're a threaded process, as are GLib and GTK+, so worker
+            # processes mustn't be plain forks of us; they could inherit
+            # locks held by other threads. Without a fork server (e.g., on
+            # Python 2) filtered comparisons use the thread pool instead.
+            try:
+                context = multiprocessing.get_context("forkserver")
+            except (AttributeError, ValueError):
+                context = None
+            if context is None or os.name == "nt":
+                ComparisonPool.process_pool = self.thread_pool
+            else:
+                ComparisonPool.process_pool = context.Pool(
+                    None, _init_worker)
+        return self.process_pool
+
+    def scan(self, roots, name_filter):
+        """Start listing the folder in each pane concurrently
+
+        Returns a list of AsyncResults, one per root, giving the result of
+        _scan_directory for that root, or None if root isn't a folder.
+        """
+        return [self.thread_pool.apply_async(_scan_pane, (root, name_filter))
+                for root in roots]
+
+    def compare(self, fileslist, regexes, comparison_args, statslist=None):
+        """Start comparing each tuple of files in fileslist
+
+        If given, statslist holds the stat results for each tuple of files.
+        Returns a list of AsyncResults for the started comparisons.
+        """
+        if statslist is None:
+            statslist = [None] * len(fileslist)
+        regexes = tuple(regexes)
+        ignore_blank_lines = comparison_args['ignore_blank_lines']
+        if regexes or ignore_blank_lines:
+            pool = self._get_process_pool()
+        else:
+            pool = self.thread_pool
+        in_process = pool is self.thread_pool
+
+        def store_cache_entry(files, result):
+            cache_entry = result[1]
+            if cache_entry is not None:
+                _cache[(files, regexes, ignore_blank_lines)] = cache_entry
+
+        fileslist = [tuple(files) for files in fileslist]
+        _cache.preload(
+            [(files, regexes, ignore_blank_lines) for files in fileslist])
+
+        pending = []
+        for files, stat_results in zip(fileslist, statslist):
+            callback = functools.partial(store_cache_entry, files)
+            if in_process:
+                cache_entry = None
+            else:
+                cache_entry = _cache.get((files, regexes, ignore_blank_lines))
+            pending.append(pool.apply_async(
+                _files_same_worker,
+                (files, regexes, comparison_args, stat_results, cache_entry),
+                callback=callback))
+        return pending
+
+
+class CanonicalListing(object):
+    """Multi-pane lists with canonicalised matching and error detection
+
+    Names are collected per pane and matched up across panes by sorting
+    each pane's canonical names once and merging the sorted listings.
+    """
+
+    def __init__(self, n, canonicalize=None):
+        self.names = [[] for i in range(n)]
+        self.canonicalize = canonicalize
+        self._listings = None
+        self._errors = []
+
+    def add(self, pane, item):
+        self.names[pane].append(item)
+        self._listings = None
+
+    def _get_listings(self):
+        if self._listings is not None:
+            return self._listings
+
+        self._listings, self._errors = [], []
+        for pane, names in enumerate(self.names):
+            if self.canonicalize is None:
+                keys = names
+            else:
+                keys = list(map(self.canonicalize, names))
+            # Built in reverse, so that the first of any clashing names wins
+            listing = dict(zip(reversed(keys), reversed(names)))
+            if len(listing) != len(names):
+                for key, name in zip(keys, names):
+                    if listing[key] != name:
+                        self._errors.append((pane, name, listing[key]))
+            self._listings.append(listing)
+        return self._listings
+
+    @property
+    def errors(self):
+        """Names shadowed by another name in the same pane
+
+        Errors are (pane, shadowed name, shadowing name) tuples.
+        """
+        self._get_listings()
+        return self._errors
+
+    def get(self):
+        """Get per-pane name tuples, sorted by name
+
+        Names missing from a pane are filled in from the first pane
+        having a matching name. Canonical names are only used for
+        matching; rows are sorted by their names as shown.
+        """
+        listings = self._get_listings()
+        keys = sorted(listings[0])
+        seen = set(keys)
+        for listing in listings[1:]:
+            extra = set(listing).difference(seen)
+            if extra:
+                seen.update(extra)
+                # Timsort merges the two sorted runs in linear time
+                keys = sorted(keys + sorted(extra))
+
+        columns = [list(map(listing.get, keys)) for listing in listings]
+        if any(None in column for column in columns):
+            first = columns[-1]
+            for column in reversed(columns[:-1]):
+                first = [a if a is not None else b
+                         for a, b in zip(column, first)]
+            columns = [[a if a is not None else b
+                        for a, b in zip(column, first)]
+                       for column in columns]
+        rows = list(zip(*columns))
+        if self.canonicalize is not None:
+            rows.sort()
+        return rows
+
+
+class FolderListing(object):
+    """A folder's entries in each pane, matched up across panes
+
+    Listings are built from the per-pane results of ComparisonPool.scan().
+    Symlinks are followed, except for those whose targets are in
+    symlinks_followed (which is updated), or if ignore_symlinks is true.
+
+    The resulting dirs and files are CanonicalListings, and stats gives
+    the followed stat results of their entries by path. Problems with
+    listing a pane or its entries are given as (pane, message) tuples in
+    errors, and different is set if any of them imply a difference.
+    Undecodable names are given as (pane, name) tuples in invalid_names,
+    and listed says which panes were successfully listed.
+    """
+
+    def __init__(self, roots, scans, canonicalize=None, ignore_symlinks=False,
+                 symlinks_followed=None):
+        if symlinks_followed is None:
+            symlinks_followed = set()
+        self.dirs = CanonicalListing(len(roots), canonicalize)
+        self.files = CanonicalListing(len(roots), canonicalize)
+        self.stats = {}
+        self.errors = []
+        self.invalid_names = []
+        self.listed = [False] * len(roots)
+        self.different = False
+
+        for pane, root in enumerate(roots):
+            try:
+                scan = scans[pane].get()
+            except OSError as err:
+                self.errors.append((pane, err.strerror))
+                self.different = True
+                continue
+            if scan is None:
+                continue
+
+            entries, invalid_names = scan
+            self.listed[pane] = True
+            for name in invalid_names:
+                self.invalid_names.append((pane, name))
+
+            for e, s, err in entries:
+                # Covers certain unreadable symlink cases; see bgo#585895
+                if s is None:
+                    self.errors.append((pane, e + err.strerror))
+                    continue
+
+                if stat.S_ISLNK(s.st_mode):
+                    if ignore_symlinks:
+                        continue
+                    key = (s.st_dev, s.st_ino)
+                    if key in symlinks_followed:
+                        continue
+                    symlinks_followed.add(key)
+                    try:
+                        s = os.stat(os.path.join(root, e))
+                    except OSError as err:
+                        if err.errno == errno.ENOENT:
+                            error_string = e + ": Dangling symlink"
+                        else:
+                            error_string = e + err.strerror
+                        self.errors.append((pane, error_string))
+                        self.different = True
+                        continue
+
+                if stat.S_ISREG(s.st_mode):
+                    self.files.add(pane, e)
+                elif stat.S_ISDIR(s.st_mode):
+                    self.dirs.add(pane, e)
+                else:
+                    # FIXME: Unhandled stat type
+                    continue
+                self.stats[os.path.join(root, e)] = s
+
+
+# States of entries reported by compare_folders()
+STATE_SAME = "same"
+STATE_SAME_FILTERED = "same-filtered"
+STATE_NEW = "new"
+STATE_MODIFIED = "modified"
+STATE_ERROR = "error"
+
+ComparisonEntry = namedtuple(
+    'ComparisonEntry', 'path kind present state error')
+
+
+def result_state(present, result):
+    """Get the state of an entry from the comparison of its present files
+
+    This follows the states shown for rows in folder comparisons.
+    """
+    if all(present):
+        if result in (Same, DodgySame):
+            return STATE_SAME
+        elif result == SameFiltered:
+            return STATE_SAME_FILTERED
+    elif result in (Same, SameFiltered, DodgySame):
+        return STATE_NEW
+    if result == FileError:
+        return STATE_ERROR
+    return STATE_MODIFIED
+
+
+def compare_folders(roots, comparison_args, regexes=(), name_filter=None,
+                    canonicalize=None, ignore_symlinks=False, pool=None):
+    """Compare folder trees, yielding a ComparisonEntry for each entry
+
+    Folders are visited depth-first. Each folder's subfolders and files
+    are yielded once its files have been compared, with paths relative to
+    the roots. Problems listing folders are yielded as "error" entries,
+    with present showing the pane concerned.
+    """
+    if pool is None:
+        pool = ComparisonPool()
+    regexes = tuple(regexes)
+    symlinks_followed = set()
+
+    def folder_roots(folder):
+        return [os.path.join(r, folder) if folder else r for r in roots]
+
+    def pane_present(pane):
+        return tuple(i == pane for i in range(len(roots)))
+
+    def listed(listing, paths, is_kind):
+        # A name can be a folder in one pane and a file in another, so
+        # entries are only present in panes where they're of their kind
+        return tuple(p in listing.stats and is_kind(listing.stats[p].st_mode)
+                     for p in paths)
+
+    def match_key(names):
+        return canonicalize(names[0]) if canonicalize else names[0]
+
+    # Folders waiting to be compared, as a stack with the next folder last
+    todo = [""]
+    prefetched = {}
+    while todo:
+        folder = todo.pop()
+        froots = folder_roots(folder)
+        scans = prefetched.pop(folder, None)
+        if scans is None:
+            scans = pool.scan(froots, name_filter)
+        for next_folder in todo[-PREFETCH_FOLDERS:]:
+            if next_folder not in prefetched:
+                prefetched[next_folder] = pool.scan(
+                    folder_roots(next_folder), name_filter)
+
+        listing = FolderListing(
+            froots, scans, canonicalize, ignore_symlinks, symlinks_followed)
+        for pane, message in listing.errors:
+            yield ComparisonEntry(
+                folder, "error", pane_present(pane), STATE_ERROR, message)
+        for pane, name in listing.invalid_names:
+            yield ComparisonEntry(
+                folder, "error", pane_present(pane), STATE_ERROR,
+                "Invalid file name: %s" % name)
+        for pane, name, shadowing in (listing.dirs.errors +
+                                      listing.files.errors):
+            yield ComparisonEntry(
+                folder, "error", pane_present(pane), STATE_ERROR,
+                "%s is hidden by %s" % (name, shadowing))
+
+        fileslist = listing.files.get()
+        file_presents = {}
+        for names in fileslist:
+            paths = [os.path.join(r, n) for r, n in zip(froots, names)]
+            file_presents[match_key(names)] = listed(
+                listing, paths, stat.S_ISREG)
+
+        subfolders = []
+        for names in listing.dirs.get():
+            paths = [os.path.join(r, n) for r, n in zip(froots, names)]
+            present = listed(listing, paths, stat.S_ISDIR)
+            path = os.path.join(folder, names[0])
+            file_present = file_presents.pop(match_key(names), None)
+            if file_present is not None:
+                # A folder in one pane and a file in another is a single
+                # modified entry, as folder comparisons show it
+                present = tuple(d or f for d, f in zip(present, file_present))
+                yield ComparisonEntry(
+                    path, "folder", present, STATE_MODIFIED, None)
+                continue
+            state = STATE_SAME if all(present) else STATE_NEW
+            subfolders.append(path)
+            yield ComparisonEntry(path, "folder", present, state, None)
+
+        # All files are compared concurrently, and reported in order
+        fileslist = [names for names in fileslist
+                     if match_key(names) in file_presents]
+        batch, batch_stats, presents = [], [], []
+        for names in fileslist:
+            paths = [os.path.join(r, n) for r, n in zip(froots, names)]
+            present = file_presents[match_key(names)]
+            paths = [p for p, is_present in zip(paths, present) if is_present]
+            batch.append(paths)
+            batch_stats.append([listing.stats[p] for p in paths])
+            presents.append(present)
+        results = pool.compare(batch, regexes, comparison_args, batch_stats)
+        for names, present, result in zip(fileslist, presents, results):
+            state = result_state(present, result.get()[0])
+            yield ComparisonEntry(
+                os.path.join(folder, names[0]), "file", present, state, None)
+
+        todo.extend(reversed(subfolders))
+
+    flush_cache()
+
+
+def main(args):
+    """Compare folders from the command line, returning an exit status
+
+    The status is 0 if the folders are the same, 1 if they differ, and 2
+    if there were errors.
+    """
+    from meld.conf import _
+
+    parser = optparse.OptionParser(
+        usage=_("%prog --compare-dirs [options] FOLDER1 FOLDER2 [FOLDER3]"),
+        description=_("Compare folders without starting the user interface"))
+    parser.add_option(
+        "--compare-dirs", action="store_true",
+        help=_("Compare folders and print the results"))
+    parser.add_option(
+        "--json", action="store_true",
+        help=_("Print each result as a line of JSON"))
+    parser.add_option(
+        "--all", action="store_true",
+        help=_("Print results for all entries, not just differing ones"))
+    parser.add_option(
+        "--shallow", action="store_true",
+        help=_("Compare files based only on size and modification time"))
+    parser.add_option(
+        "--digest", action="store_true",
+        help=_("Compare file contents using cached digests"))
+    parser.add_option(
+        "--time-resolution", type="int", default=100, metavar="NS",
+        help=_("Modification time resolution in nanoseconds"))
+    parser.add_option(
+        "--ignore-case", action="store_true",
+        help=_("Match file names across folders regardless of case"))
+    parser.add_option(
+        "--ignore-symlinks", action="store_true",
+        help=_("Ignore symbolic links"))
+    parser.add_option(
+        "--ignore-blank-lines", action="store_true",
+        help=_("Ignore changes that only insert or delete blank lines"))
+    parser.add_option(
+        "--exclude", action="append", default=[], metavar="PATTERN",
+        help=_("Ignore files and folders matching the shell PATTERN"))
+    parser.add_option(
+        "--text-filter", action="append", default=[], metavar="REGEX",
+        help=_("Ignore text matching REGEX when comparing files"))
+    options, roots = parser.parse_args(args)
+
+    if not 2 <= len(roots) <= 3:
+        parser.error(_("Wrong number of arguments (Got %i)") % len(roots))
+    for root in roots:
+        if not os.path.isdir(root):
+            parser.error(_("%s is not a folder") % root)
+
+    try:
+        regexes = [re.compile(r + "(?m)") for r in options.text_filter]
+    except re.error as err:
+        parser.error(_("Invalid text filter: %s") % err)
+
+    name_filter = None
+    if options.exclude:
+        name_filter = filters.NameFilterMatcher(options.exclude)
+
+    comparison_args = {
+        'shallow-comparison': options.shallow,
+        'digest-comparison': options.digest,
+        'time-resolution': options.time_resolution,
+        'ignore_blank_lines': options.ignore_blank_lines,
+    }
+    entries = compare_folders(
+        [os.path.abspath(r) for r in roots], comparison_args, regexes,
+        name_filter, casefold if options.ignore_case else None,
+        options.ignore_symlinks)
+
+    status = 0
+    for entry in entries:
+        if entry.state == STATE_ERROR:
+            status = 2
+        elif entry.state not in (STATE_SAME, STATE_SAME_FILTERED):
+            status = max(status, 1)
+        elif not options.all:
+            continue
+
+        if options.json:
+            print(json.dumps(entry._asdict()))
+        else:
+            present = "".join("+" if p else "-" for p in entry.present)
+            line = "%-13s %s %s" % (entry.state, present, entry.path or ".")
+            if entry.error:
+                line += ": " + entry.error
+            print(line)
+        sys.stdout.flush()
+    return status
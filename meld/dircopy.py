@@ -0,0 +1,281 @@
+# Copyright (C) 2014 Kai Willadsen <kai.willadsen@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Concurrent copying of folder trees
+
+The source tree is walked once, creating folders as it goes, while files
+are copied by a bounded pool of worker threads. File contents are copied
+in the kernel with copy_file_range() or sendfile() where available.
+
+Copying doesn't stop at the first error; errors are collected and
+reported at the end. Files are copied along with their modification
+times, so an interrupted or failed copy can be resumed by copying again
+with skip_copied, which skips destination files that already match their
+source's size and mtime.
+"""
+
+import errno
+import os
+import shutil
+import stat
+import sys
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Errors indicating that a zero-copy method can't be used for a file pair,
+# in which case we fall back to the next method.
+_UNSUPPORTED_ERRNOS = set(getattr(errno, name) for name in (
+    "EXDEV", "ENOSYS", "EINVAL", "EOPNOTSUPP", "ENOTSUP", "EBADF",
+    "ETXTBSY") if hasattr(errno, name))
+
+
+def _copy_file_range(infd, outfd, offset, count):
+    return os.copy_file_range(infd, outfd, count, offset)
+
+
+def _sendfile(infd, outfd, offset, count):
+    return os.sendfile(outfd, infd, offset, count)
+
+
+_zero_copy_methods = []
+if hasattr(os, "copy_file_range"):
+    _zero_copy_methods.append(_copy_file_range)
+# Only Linux supports sendfile() to regular files
+if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    _zero_copy_methods.append(_sendfile)
+
+
+def _copy_contents(src, dst, size):
+    """Copy the contents of src to dst, returning the bytes copied"""
+    infd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        outfd = os.open(
+            dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC |
+            getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            offset = 0
+            for method in _zero_copy_methods:
+                try:
+                    while offset < size:
+                        sent = method(infd, outfd, offset,
+                                      min(size - offset, 1 << 30))
+                        if not sent:
+                            break
+                        offset += sent
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                else:
+                    # Files may grow while being copied, so we still
+                    # check for anything past the size we were given.
+                    break
+
+            os.lseek(infd, offset, os.SEEK_SET)
+            os.lseek(outfd, offset, os.SEEK_SET)
+            while True:
+                data = os.read(infd, COPY_CHUNK_SIZE)
+                if not data:
+                    break
+                while data:
+                    written = os.write(outfd, data)
+                    offset += written
+                    data = data[written:]
+        finally:
+            os.close(outfd)
+    finally:
+        os.close(infd)
+    return offset
+
+
+def _copystat(src, dst):
+    # Copying to e.g., NTFS can fail to set permissions; see bug 568000
+    try:
+        shutil.copystat(src, dst)
+    except OSError as e:
+        if e.errno != errno.EPERM:
+            raise
+
+
+def _is_copied(src_stat, dst_stat):
+    """Whether a destination file looks like a completed copy of its source
+
+    Completed copies have their source's mtime, which interrupted copies
+    never have. We allow for the sub-millisecond precision lost in setting
+    times from floats.
+    """
+    return (stat.S_ISREG(dst_stat.st_mode) and
+            dst_stat.st_size == src_stat.st_size and
+            abs(dst_stat.st_mtime - src_stat.st_mtime) < 0.001)
+
+
+def copy_file(src, dst, skip_copied=False):
+    """Copy a file or symlink, returning the number of bytes copied
+
+    Like shutil.copy2, except that symlinks are copied as links, and
+    failing to copy permissions isn't an error. If skip_copied is true,
+    destination files that are already complete copies are left alone.
+    """
+    src_stat = os.lstat(src)
+    if stat.S_ISLNK(src_stat.st_mode):
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        os.symlink(os.readlink(src), dst)
+        return 0
+
+    if not stat.S_ISREG(src_stat.st_mode):
+        raise OSError(errno.EINVAL, "Not a file", src)
+
+    if skip_copied:
+        try:
+            if _is_copied(src_stat, os.stat(dst)):
+                return 0
+        except OSError:
+            pass
+
+    copied = _copy_contents(src, dst, src_stat.st_size)
+    _copystat(src, dst)
+    return copied
+
+
+class TreeCopy(object):
+    """Copy of a folder tree, driven by a scheduler task
+
+    copy_iter() walks the source tree and yields regularly while files
+    are copied in the background. Progress is available from the files,
+    files_done, bytes_copied and current attributes, and any errors
+    encountered are collected in errors as (src, dst, error) tuples.
+    If skip_copied is true, files that were already completely copied are
+    left alone.
+    """
+
+    def __init__(self, src, dst, threads=4, skip_copied=False):
+        self.src = src
+        self.dst = dst
+        self.threads = threads
+        self.skip_copied = skip_copied
+        self.files = 0
+        self.files_done = 0
+        self.bytes_copied = 0
+        self.current = None
+        self.errors = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop copying; files not already being copied are skipped"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _copy_one(self, src, dst):
+        if self.cancelled:
+            return
+        try:
+            copied = copy_file(src, dst, self.skip_copied)
+        except (OSError, IOError) as e:
+            copied = 0
+            with self._lock:
+                self.errors.append((src, dst, e))
+        with self._lock:
+            self.files_done += 1
+            self.bytes_copied += copied
+
+    def _make_dir(self, src, dst):
+        try:
+            os.mkdir(dst)
+        except OSError as e:
+            if e.errno != errno.EEXIST or not os.path.isdir(dst):
+                self.errors.append((src, dst, e))
+                return False
+        return True
+
+    def copy_iter(self):
+        """Copy the tree, yielding True while work remains
+
+        If the source is a symlink, the link itself is copied. Closing
+        the iterator before it finishes cancels the copy.
+        """
+        if os.path.islink(self.src):
+            self._copy_one(self.src, self.dst)
+            return
+
+        pool = ThreadPool(self.threads)
+        # Limit the queued copies, to bound memory use on large trees
+        max_queued = self.threads * 16
+        queued = []
+        copied_dirs = []
+        completed = False
+        try:
+            if not self._make_dir(self.src, self.dst):
+                return
+            todo = [(self.src, self.dst)]
+            while todo and not self.cancelled:
+                src_dir, dst_dir = todo.pop()
+                self.current = src_dir
+                copied_dirs.append((src_dir, dst_dir))
+                try:
+                    names = sorted(os.listdir(src_dir))
+                except OSError as e:
+                    self.errors.append((src_dir, dst_dir, e))
+                    continue
+
+                subdirs = []
+                for name in names:
+                    src_path = os.path.join(src_dir, name)
+                    dst_path = os.path.join(dst_dir, name)
+                    if (os.path.isdir(src_path) and
+                            not os.path.islink(src_path)):
+                        if self._make_dir(src_path, dst_path):
+                            subdirs.append((src_path, dst_path))
+                        continue
+                    self.files += 1
+                    queued.append(pool.apply_async(
+                        self._copy_one, (src_path, dst_path)))
+                    while len(queued) >= max_queued:
+                        queued = [r for r in queued if not r.ready()]
+                        if len(queued) >= max_queued:
+                            queued[0].wait(0.05)
+                            yield True
+                todo.extend(reversed(subdirs))
+                yield True
+
+            while queued:
+                queued[0].wait(0.05)
+                queued = [r for r in queued if not r.ready()]
+                yield True
+
+            # Folder mtimes change as their contents are copied, so we
+            # set them deepest-first once everything else is done.
+            if not self.cancelled:
+                for src_dir, dst_dir in reversed(copied_dirs):
+                    try:
+                        _copystat(src_dir, dst_dir)
+                    except OSError as e:
+                        self.errors.append((src_dir, dst_dir, e))
+            completed = True
+        finally:
+            pool.close()
+            # Copies already in progress when cancelled are left to
+            # finish in the background.
+            if completed:
+                pool.join()
+            else:
+                self.cancel()
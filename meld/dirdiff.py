@@ -14,16 +14,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import collections
 import copy
 import datetime
-import errno
 import functools
 import os
-import re
-import shutil
 import stat
 import sys
+import weakref
 
 from gi.repository import GLib
 from gi.repository import Gio
@@ -31,15 +28,18 @@ from gi.repository import GObject
 from gi.repository import Gdk
 from gi.repository import Gtk
 
+from . import dircopy
+from . import filters
 from . import melddoc
 from . import tree
 from . import misc
 from . import recent
 from .ui import gnomeglade
 from .ui import emblemcellrenderer
-
-from collections import namedtuple
-from decimal import Decimal
+from .dircompare import (
+    PREFETCH_FOLDERS, ComparisonPool, FolderListing, StatItem, casefold,
+    Same, SameFiltered, DodgySame, Different, FileError, files_same,
+    flush_cache)
 
 from meld.conf import _
 from meld.settings import bind_settings, meldsettings, settings
@@ -51,155 +51,12 @@ from meld.settings import bind_settings, meldsettings, settings
 #
 ################################################################################
 
-class StatItem(namedtuple('StatItem', 'mode size time')):
-    __slots__ = ()
-
-    @classmethod
-    def _make(cls, stat_result):
-        return StatItem(stat.S_IFMT(stat_result.st_mode),
-                        stat_result.st_size, stat_result.st_mtime)
-
-    def shallow_equal(self, other, time_resolution_ns):
-        if self.size != other.size:
-            return False
-
-        # Shortcut to avoid expensive Decimal calculations. 2 seconds is our
-        # current accuracy threshold (for VFAT), so should be safe for now.
-        if abs(self.time - other.time) > 2:
-            return False
-
-        dectime1 = Decimal(str(self.time)).scaleb(Decimal(9)).quantize(1)
-        dectime2 = Decimal(str(other.time)).scaleb(Decimal(9)).quantize(1)
-        mtime1 = dectime1 // time_resolution_ns
-        mtime2 = dectime2 // time_resolution_ns
-
-        return mtime1 == mtime2
-
-
-CacheResult = namedtuple('CacheResult', 'stats result')
-
-
-_cache = {}
-Same, SameFiltered, DodgySame, DodgyDifferent, Different, FileError = \
-    list(range(6))
-# TODO: Get the block size from os.stat
-CHUNK_SIZE = 4096
-
-
-def all_same(lst):
-    return not lst or lst.count(lst[0]) == len(lst)
-
-
-def remove_blank_lines(text):
-    splits = text.splitlines()
-    lines = text.splitlines(True)
-    blanks = set([i for i, l in enumerate(splits) if not l])
-    lines = [l for i, l in enumerate(lines) if i not in blanks]
-    return ''.join(lines)
-
-
-def _files_same(files, regexes, comparison_args):
-    """Determine whether a list of files are the same.
-
-    Possible results are:
-      Same: The files are the same
-      SameFiltered: The files are identical only after filtering with 'regexes'
-      DodgySame: The files are superficially the same (i.e., type, size, mtime)
-      DodgyDifferent: The files are superficially different
-      FileError: There was a problem reading one or more of the files
-    """
-
-    # One file is the same as itself
-    if len(files) < 2:
-        return Same
-
-    files = tuple(files)
-    regexes = tuple(regexes)
-    stats = tuple([StatItem._make(os.stat(f)) for f in files])
-
-    shallow_comparison = comparison_args['shallow-comparison']
-    time_resolution_ns = comparison_args['time-resolution']
-    ignore_blank_lines = comparison_args['ignore_blank_lines']
-
-    need_contents = regexes or ignore_blank_lines
-
-    # If all entries are directories, they are considered to be the same
-    if all([stat.S_ISDIR(s.mode) for s in stats]):
-        return Same
-
-    # If any entries are not regular files, consider them different
-    if not all([stat.S_ISREG(s.mode) for s in stats]):
-        return Different
-
-    # Compare files superficially if the options tells us to
-    if shallow_comparison:
-        if all(s.shallow_equal(stats[0], time_resolution_ns) for s in stats[1:]):
-            return DodgySame
-        else:
-            return Different
-
-    # If there are no text filters, unequal sizes imply a difference
-    if not need_contents and not all_same([s.size for s in stats]):
-        return Different
-
-    # Check the cache before doing the expensive comparison
-    cache_key = (files, regexes, ignore_blank_lines)
-    cache = _cache.get(cache_key)
-    if cache and cache.stats == stats:
-        return cache.result
-
-    # Open files and compare bit-by-bit
-    contents = [[] for f in files]
-    result = None
-
-    try:
-        handles = [open(f, "rb") for f in files]
-        try:
-            data = [h.read(CHUNK_SIZE) for h in handles]
-
-            # Rough test to see whether files are binary. If files are guessed
-            # to be binary, we don't examine contents for speed and space.
-            if any(["\0" in d for d in data]):
-                need_contents = False
-
-            while True:
-                if all_same(data):
-                    if not data[0]:
-                        break
-                else:
-                    result = Different
-                    if not need_contents:
-                        break
-
-                if need_contents:
-                    for i in range(len(data)):
-                        contents[i].append(data[i])
-
-                data = [h.read(CHUNK_SIZE) for h in handles]
-
-        # Files are too large; we can't apply filters
-        except (MemoryError, OverflowError):
-            result = DodgySame if all_same(stats) else DodgyDifferent
-        finally:
-            for h in handles:
-                h.close()
-    except IOError:
-        # Don't cache generic errors as results
-        return FileError
-
-    if result is None:
-        result = Same
-
-    if result == Different and need_contents:
-        contents = ["".join(c) for c in contents]
-        for r in regexes:
-            contents = [re.sub(r, "", c) for c in contents]
-        if ignore_blank_lines:
-            contents = [remove_blank_lines(c) for c in contents]
-        result = SameFiltered if all_same(contents) else Different
-
-    _cache[cache_key] = CacheResult(stats, result)
-    return result
+# Number of rows compared at a time when comparing contents after a scan
+DEFERRED_BATCH_SIZE = 256
+# Milliseconds to wait for further folder changes before updating rows
+MONITOR_DELAY = 500
+# Number of files copied concurrently when copying folders
+COPY_THREADS = 4
 
 
 COL_EMBLEM, COL_SIZE, COL_TIME, COL_PERMS, COL_END = \
@@ -211,32 +68,6 @@ class DirDiffTreeStore(tree.DiffTreeStore):
         tree.DiffTreeStore.__init__(self, ntree, [str, str, str, str])
 
 
-class CanonicalListing(object):
-    """Multi-pane lists with canonicalised matching and error detection"""
-
-    def __init__(self, n, canonicalize=None):
-        self.items = collections.defaultdict(lambda: [None] * n)
-        self.errors = []
-        if canonicalize is not None:
-            self.canonicalize = canonicalize
-            self.add = self.add_canon
-
-    def add(self, pane, item):
-        self.items[item][pane] = item
-
-    def add_canon(self, pane, item):
-        ci = self.canonicalize(item)
-        if self.items[ci][pane] is None:
-            self.items[ci][pane] = item
-        else:
-            self.errors.append((pane, item, self.items[ci][pane]))
-
-    def get(self):
-        first = lambda seq: next(s for s in seq if s)
-        filled = lambda seq: tuple([s or first(seq) for s in seq])
-        return sorted(filled(v) for v in self.items.values())
-
-
 ################################################################################
 #
 # DirDiff
@@ -251,6 +82,9 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
     __gsettings_bindings__ = (
         ('folder-ignore-symlinks', 'ignore-symlinks'),
         ('folder-shallow-comparison', 'shallow-comparison'),
+        ('folder-digest-comparison', 'digest-comparison'),
+        ('folder-deferred-comparison', 'deferred-comparison'),
+        ('folder-live-comparison', 'live-comparison'),
         ('folder-time-resolution', 'time-resolution'),
         ('folder-status-filters', 'status-filters'),
         ('ignore-blank-lines', 'ignore-blank-lines'),
@@ -274,6 +108,24 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         blurb="Whether to compare files based solely on size and mtime",
         default=False,
     )
+    digest_comparison = GObject.property(
+        type=bool,
+        nick="Use digest comparison",
+        blurb="Whether to compare file contents using cached digests",
+        default=False,
+    )
+    deferred_comparison = GObject.property(
+        type=bool,
+        nick="Defer content comparison",
+        blurb="Whether to show folder structure before comparing contents",
+        default=False,
+    )
+    live_comparison = GObject.property(
+        type=bool,
+        nick="Live comparison",
+        blurb="Whether to update the comparison as folder contents change",
+        default=False,
+    )
     status_filters = GObject.property(
         type=GObject.TYPE_STRV,
         nick="File status filters",
@@ -290,6 +142,7 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
 
     """Dictionary mapping tree states to corresponding difflib-like terms"""
     chunk_type_map = {
+        tree.STATE_NONE: None,
         tree.STATE_NORMAL: None,
         tree.STATE_NOCHANGE: None,
         tree.STATE_NEW: "insert",
@@ -411,6 +264,19 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
             self.scrolledwindow[i].get_hadjustment().connect(
                 "value-changed", self._sync_hscroll)
         self.linediffs = [[], []]
+        self.comparison_pool = ComparisonPool()
+        # Tree paths of rows by file path, checked on lookup; see _find_row
+        self.row_index = {}
+        # Stat signatures of scanned rows by file paths, for refreshing
+        self.row_stats = {}
+        # Monitors of scanned folders, and their changes waiting to be shown
+        self.folder_monitors = {}
+        self.monitor_events = {}
+        self.monitor_timeout = None
+        # Running folder copy tasks, which are kept when scans are stopped
+        self.copy_tasks = weakref.WeakSet()
+        # Source and destination folders of copies that didn't complete
+        self.incomplete_copies = set()
 
         self.update_treeview_columns(settings, 'folder-columns')
         settings.connect('changed::folder-columns',
@@ -418,8 +284,10 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
 
         self.update_comparator()
         self.connect("notify::shallow-comparison", self.update_comparator)
+        self.connect("notify::digest-comparison", self.update_comparator)
         self.connect("notify::time-resolution", self.update_comparator)
         self.connect("notify::ignore-blank-lines", self.update_comparator)
+        self.connect("notify::live-comparison", self.on_live_comparison_changed)
 
         self.state_filters = []
         for s in self.state_actions:
@@ -460,11 +328,13 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
     def update_comparator(self, *args):
         comparison_args = {
             'shallow-comparison': self.props.shallow_comparison,
+            'digest-comparison': self.props.digest_comparison,
             'time-resolution': self.props.time_resolution,
             'ignore_blank_lines': self.props.ignore_blank_lines,
         }
+        self.comparison_args = comparison_args
         self.file_compare = functools.partial(
-            _files_same, comparison_args=comparison_args)
+            files_same, comparison_args=comparison_args)
         self.refresh()
 
     def update_treeview_columns(self, settings, key):
@@ -606,6 +476,7 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         if 1 in is_present:
             self._update_item_state(it)
         else: # nope its gone
+            self._forget_rows(it)
             self.model.remove(it)
         self._update_diffmaps()
 
@@ -635,13 +506,16 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         locations = [os.path.abspath(l or ".") for l in locations]
         self.current_path = None
         self.model.clear()
+        self.row_index = {}
+        self.row_stats = {}
+        self._remove_folder_monitors()
         for pane, loc in enumerate(locations):
             self.fileentry[pane].set_filename(loc)
         child = self.model.add_entries(None, locations)
         self.treeview0.grab_focus()
         self._update_item_state(child)
         self.recompute_label()
-        self.scheduler.remove_all_tasks()
+        self._remove_scan_tasks()
         self.recursively_update(Gtk.TreePath.new_first())
         self._update_diffmaps()
 
@@ -653,21 +527,34 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
             folders = []
         return recent.TYPE_FOLDER, folders
 
-    def recursively_update( self, path ):
+    def recursively_update( self, path, incremental=False ):
         """Recursively update from tree path 'path'.
+
+        If 'incremental' is true, existing rows are kept and only updated
+        where their files' presence or stat details have changed.
         """
         it = self.model.get_iter( path )
-        child = self.model.iter_children( it )
-        while child:
-            self.model.remove(child)
+        if not incremental:
             child = self.model.iter_children( it )
+            while child:
+                self._forget_rows(child)
+                self.model.remove(child)
+                child = self.model.iter_children( it )
         self._update_item_state(it)
-        self.scheduler.add_task(self._search_recursively_iter(path))
+        self.scheduler.add_task(
+            self._search_recursively_iter(path, incremental))
 
-    def _search_recursively_iter(self, rootpath):
-        for t in self.treeview:
-            sel = t.get_selection()
-            sel.unselect_all()
+    def _search_recursively_iter(self, rootpath, incremental=False):
+        """Scan the folders below tree path 'rootpath', adding their rows
+
+        An incremental scan reuses existing rows, as for
+        recursively_update(), and leaves the selection, expanded folders
+        and tree-wide error messages as they were.
+        """
+        if not incremental:
+            for t in self.treeview:
+                sel = t.get_selection()
+                sel.unselect_all()
 
         yield _("[%s] Scanning %s") % (self.label_text, "")
         prefixlen = 1 + len( self.model.value_path( self.model.get_iter(rootpath), 0 ) )
@@ -675,16 +562,37 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         # TODO: This is horrible.
         if isinstance(rootpath, tuple):
             rootpath = Gtk.TreePath(rootpath)
+        # Folders waiting to be scanned, as a stack with the next folder
+        # last. Children are pushed in reverse, giving a depth-first scan.
         todo = [rootpath]
+        # Listings started in the background for upcoming folders
+        prefetched = {}
         expanded = set()
+        patterns = [f.filter_string for f in self.name_filters
+                    if f.active and f.filter is not None]
+        name_filter = None
+        if patterns:
+            name_filter = filters.NameFilterMatcher(patterns)
+
+        # Rows whose content comparison is left until the tree is built
+        defer = (self.props.deferred_comparison and
+                 not self.props.shallow_comparison)
+        pending = [] if defer else None
 
         shadowed_entries = []
         invalid_filenames = []
-        while len(todo):
-            todo.sort() # depth first
-            path = todo.pop(0)
+        while todo:
+            path = todo.pop()
             it = self.model.get_iter( path )
             roots = self.model.value_paths( it )
+            scans = prefetched.pop(tuple(roots), None)
+
+            for next_path in todo[-PREFETCH_FOLDERS:]:
+                next_it = self.model.get_iter(next_path)
+                next_roots = tuple(self.model.value_paths(next_it))
+                if next_roots not in prefetched:
+                    prefetched[next_roots] = self.comparison_pool.scan(
+                        next_roots, name_filter)
 
             # Buggy ordering when deleting rows means that we sometimes try to
             # recursively update files; this fix seems the least invasive.
@@ -692,95 +600,112 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
                 continue
 
             yield _("[%s] Scanning %s") % (self.label_text, roots[0][prefixlen:])
-            differences = False
-            encoding_errors = []
+
+            # Existing rows by file paths, with error and empty rows removed
+            existing = {}
+            if incremental:
+                child = self.model.iter_children(it)
+                while child:
+                    paths = tuple(self.model.value_paths(child))
+                    if paths[0] is not None:
+                        existing[paths] = child
+                        child = self.model.iter_next(child)
+                    elif not self.model.remove(child):
+                        break
 
             canonicalize = None
             if self.actiongroup.get_action("IgnoreCase").get_active():
-                canonicalize = lambda x : x.lower()
-            dirs = CanonicalListing(self.num_panes, canonicalize)
-            files = CanonicalListing(self.num_panes, canonicalize)
-
-            for pane, root in enumerate(roots):
-                if not os.path.isdir(root):
-                    continue
-
-                try:
-                    entries = os.listdir(root)
-                except OSError as err:
-                    self.model.add_error(it, err.strerror, pane)
-                    differences = True
-                    continue
-
-                for f in self.name_filters:
-                    if not f.active or f.filter is None:
-                        continue
-                    entries = [e for e in entries if f.filter.match(e) is None]
-
-                for e in entries:
-                    try:
-                        if not isinstance(e, unicode):
-                            e = e.decode('utf8')
-                    except UnicodeDecodeError:
-                        approximate_name = e.decode('utf8', 'replace')
-                        encoding_errors.append((pane, approximate_name))
-                        continue
-
-                    try:
-                        s = os.lstat(os.path.join(root, e))
-                    # Covers certain unreadable symlink cases; see bgo#585895
-                    except OSError as err:
-                        error_string = e + err.strerror
-                        self.model.add_error(it, error_string, pane)
-                        continue
-
-                    if stat.S_ISLNK(s.st_mode):
-                        if self.props.ignore_symlinks:
-                            continue
-                        key = (s.st_dev, s.st_ino)
-                        if key in symlinks_followed:
-                            continue
-                        symlinks_followed.add(key)
-                        try:
-                            s = os.stat(os.path.join(root, e))
-                            if stat.S_ISREG(s.st_mode):
-                                files.add(pane, e)
-                            elif stat.S_ISDIR(s.st_mode):
-                                dirs.add(pane, e)
-                        except OSError as err:
-                            if err.errno == errno.ENOENT:
-                                error_string = e + ": Dangling symlink"
-                            else:
-                                error_string = e + err.strerror
-                            self.model.add_error(it, error_string, pane)
-                            differences = True
-                    elif stat.S_ISREG(s.st_mode):
-                        files.add(pane, e)
-                    elif stat.S_ISDIR(s.st_mode):
-                        dirs.add(pane, e)
-                    else:
-                        # FIXME: Unhandled stat type
-                        pass
-
-            for pane, f in encoding_errors:
+                canonicalize = casefold
+
+            # List all panes concurrently, so that the wait is only as long
+            # as the slowest pane's listing
+            if scans is None:
+                scans = self.comparison_pool.scan(roots, name_filter)
+            for result in scans:
+                while not result.ready():
+                    result.wait(0.05)
+                    yield _("[%s] Scanning %s") % (
+                        self.label_text, roots[0][prefixlen:])
+
+            listing = FolderListing(
+                roots, scans, canonicalize, self.props.ignore_symlinks,
+                symlinks_followed)
+            dirs, files = listing.dirs, listing.files
+            # Stat results of this folder's children, by path
+            stats = listing.stats
+            # Error rows go first, ahead of any rows being reused
+            for position, (pane, error_string) in enumerate(listing.errors):
+                self.model.add_error(it, error_string, pane, position)
+            differences = listing.different
+            if self.props.live_comparison:
+                for pane, root in enumerate(roots):
+                    if listing.listed[pane]:
+                        self._add_folder_monitor(root, pane)
+
+            for pane, f in listing.invalid_names:
                 invalid_filenames.append((pane, roots[pane], f))
 
             for pane, f1, f2 in dirs.errors + files.errors:
                 shadowed_entries.append((pane, roots[pane], f1, f2))
 
-            alldirs = self._filter_on_state(roots, dirs.get())
-            allfiles = self._filter_on_state(roots, files.get())
+            # Compare this folder's files in parallel before filtering. The
+            # results are cached, so the comparisons done while filtering
+            # and updating row states don't need to re-read any files.
+            fileslist = files.get()
+            # Rows that are unchanged since the last scan are kept as is
+            unchanged = set(
+                paths for paths in existing
+                if self._stat_signature(paths, stats) ==
+                self.row_stats.get(paths))
+            if not self.props.shallow_comparison and not defer:
+                regexes = [f.filter for f in self.text_filters if f.active]
+                batch, batch_stats = [], []
+                for names in fileslist:
+                    paths = [os.path.join(r, n) for r, n in zip(roots, names)]
+                    if tuple(paths) in unchanged:
+                        continue
+                    if all(p in stats for p in paths):
+                        batch.append(paths)
+                        batch_stats.append([stats[p] for p in paths])
+                results = self.comparison_pool.compare(
+                    batch, regexes, self.comparison_args, batch_stats)
+                for result in results:
+                    while not result.ready():
+                        result.wait(0.05)
+                        yield _("[%s] Comparing %s") % (
+                            self.label_text, roots[0][prefixlen:])
+
+            alldirs = self._filter_on_state(
+                roots, dirs.get(), stats, keep=unchanged)
+            allfiles = self._filter_on_state(
+                roots, fileslist, stats, defer, unchanged)
+
+            wanted = set(
+                tuple(os.path.join(r, n) for r, n in zip(roots, names))
+                for names in alldirs + allfiles)
+            for paths in list(existing):
+                if paths not in wanted:
+                    removed = existing.pop(paths)
+                    self._forget_rows(removed)
+                    self.model.remove(removed)
 
             if alldirs or allfiles:
+                child_paths = []
+                position = len(listing.errors)
                 for names in alldirs:
                     entries = [os.path.join(r, n) for r, n in zip(roots, names)]
-                    child = self.model.add_entries(it, entries)
-                    differences |= self._update_item_state(child)
-                    todo.append(self.model.get_path(child))
+                    child, different = self._add_or_update_item(
+                        it, entries, stats, existing, position)
+                    differences |= different
+                    child_paths.append(self.model.get_path(child))
+                    position += 1
+                todo.extend(reversed(child_paths))
                 for names in allfiles:
                     entries = [os.path.join(r, n) for r, n in zip(roots, names)]
-                    child = self.model.add_entries(it, entries)
-                    differences |= self._update_item_state(child)
+                    child, different = self._add_or_update_item(
+                        it, entries, stats, existing, position, pending)
+                    differences |= different
+                    position += 1
             else:
                 # Our subtree is empty, or has been filtered to be empty
                 if (tree.STATE_NORMAL in self.state_filters or
@@ -804,6 +729,7 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
                         # Remove the current row, and then revalidate all
                         # sibling paths on the stack by removing and
                         # readding them.
+                        self._forget_rows(it)
                         had_siblings = self.model.remove(it)
                         if had_siblings:
                             parent_path = self.model.get_path(parent)
@@ -816,15 +742,73 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
             if differences:
                 expanded.add(path)
 
-        self._show_tree_wide_errors(invalid_filenames, shadowed_entries)
-
-        for path in sorted(expanded):
-            self.treeview[0].expand_to_path(path)
+        if not incremental:
+            self._show_tree_wide_errors(invalid_filenames, shadowed_entries)
+            for path in sorted(expanded):
+                self.treeview[0].expand_to_path(path)
+        flush_cache()
         yield _("[%s] Done") % self.label_text
 
         self.scheduler.add_task(self.on_treeview_cursor_changed)
-        self.treeview[0].get_selection().select_path(Gtk.TreePath.new_first())
+        if not incremental:
+            self.treeview[0].get_selection().select_path(
+                Gtk.TreePath.new_first())
         self._update_diffmaps()
+        if pending:
+            self.scheduler.add_task(self._compare_pending_iter(pending))
+
+    def _compare_pending_iter(self, pending):
+        """Compare the contents of rows added by a structure-first scan
+
+        'pending' is a list of the file paths of rows whose states are
+        waiting on a content comparison. Comparisons run in batches in the
+        comparison pool, after which the rows are updated from the cached
+        results, and rows hidden by the current state filters are removed.
+        """
+        regexes = [f.filter for f in self.text_filters if f.active]
+        root = self.model.get_iter_first()
+        prefixlen = 1 + len(self.model.value_path(root, 0))
+
+        for start in range(0, len(pending), DEFERRED_BATCH_SIZE):
+            keys, batch = [], []
+            for key in pending[start:start + DEFERRED_BATCH_SIZE]:
+                it = self._find_pending_row(key)
+                if it is None:
+                    continue
+                keys.append(key)
+                batch.append([
+                    f for j, f in enumerate(self.model.value_paths(it))
+                    if self.model.get_state(it, j) != tree.STATE_NONEXIST])
+            results = self.comparison_pool.compare(
+                batch, regexes, self.comparison_args)
+            for result in results:
+                while not result.ready():
+                    result.wait(0.05)
+                    yield _("[%s] Comparing %s") % (
+                        self.label_text, batch[0][0][prefixlen:])
+
+            # Removing a row moves its later siblings, so update the batch
+            # back to front to keep the rest of it where it was indexed
+            for key in reversed(keys):
+                it = self._find_pending_row(key)
+                if it is None:
+                    continue
+                path = self.model.get_path(it)
+                all_present = all(
+                    self.model.get_state(it, j) != tree.STATE_NONEXIST
+                    for j in range(self.num_panes))
+                different = self._update_item_state(it)
+                if all_present:
+                    state = (tree.STATE_MODIFIED if different else
+                             tree.STATE_NORMAL)
+                    if state not in self.state_filters:
+                        self._remove_filtered_row(it)
+                        continue
+                if different and path.up():
+                    self.treeview[0].expand_to_path(path)
+            self._update_diffmaps()
+        flush_cache()
+        yield _("[%s] Done") % self.label_text
 
     def _show_tree_wide_errors(self, invalid_filenames, shadowed_entries):
         header = _("Multiple errors occurred while scanning this folder")
@@ -897,25 +881,95 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
                         dstdir = os.path.dirname( dst )
                         if not os.path.exists( dstdir ):
                             os.makedirs( dstdir )
-                        misc.copy2( src, dstdir )
+                        dircopy.copy_file(src, dst)
                         self.file_created( path, dst_pane)
                     elif os.path.isdir(src):
-                        if os.path.exists(dst):
+                        # Copying a folder again resumes an incomplete copy
+                        resume = (src, dst) in self.incomplete_copies
+                        if os.path.exists(dst) and not resume:
                             if misc.run_dialog( _("'%s' exists.\nOverwrite?") % os.path.basename(dst),
                                     parent = self,
                                     buttonstype = Gtk.ButtonsType.OK_CANCEL) != Gtk.ResponseType.OK:
                                 continue
-                        misc.copytree(src, dst)
-                        self.recursively_update( path )
-                except (OSError, IOError, shutil.Error) as err:
-                    misc.error_dialog(
-                        _("Error copying file"),
-                        _("Couldn't copy %s\nto %s.\n\n%s") % (
-                            GLib.markup_escape_text(src),
-                            GLib.markup_escape_text(dst),
-                            GLib.markup_escape_text(str(err)),
-                        )
-                    )
+                        copy_task = self._copy_tree_iter(
+                            src, dst, dst_pane, resume)
+                        self.copy_tasks.add(copy_task)
+                        self.scheduler.add_task(copy_task)
+                except (OSError, IOError) as err:
+                    self._copy_error_dialog([(src, dst, err)])
+
+    def _copy_tree_iter(self, src, dst, dst_pane, resume=False):
+        """Copy the folder src to dst as a scheduler task
+
+        If resume is true, files that were completely copied by an earlier
+        copy are skipped. Copies that don't complete are remembered, so
+        that copying the same folder again resumes them.
+
+        Like scans, copies run in our FIFO scheduler so that they can be
+        stopped, which means that scans and live updates started during a
+        copy wait for it to finish. The copied folder is then rescanned
+        incrementally, keeping the selection and expanded folders.
+        """
+        copier = dircopy.TreeCopy(src, dst, COPY_THREADS, resume)
+        copying = copier.copy_iter()
+        self.incomplete_copies.add((src, dst))
+        finished = False
+        try:
+            for status in copying:
+                yield _("[%s] Copying %s (%d of %d files)") % (
+                    self.label_text,
+                    copier.current[len(src) + 1:] if copier.current else "",
+                    copier.files_done, copier.files)
+            finished = True
+        finally:
+            # Stopping the task cancels the remaining copies
+            copying.close()
+            if not finished:
+                self._copy_stopped_msg(copier, dst_pane)
+
+        if not copier.errors:
+            self.incomplete_copies.discard((src, dst))
+        # The copied folder's row may have moved while we were copying
+        it = self._find_row(dst, dst_pane)
+        if it is not None:
+            self.recursively_update(self.model.get_path(it), incremental=True)
+        if copier.errors:
+            self._copy_error_dialog(copier.errors)
+
+    def _copy_error_messages(self, errors):
+        max_errors = 10
+        messages = [
+            _("Couldn't copy %s\nto %s.\n\n%s") % (
+                GLib.markup_escape_text(src),
+                GLib.markup_escape_text(dst),
+                GLib.markup_escape_text(str(err)),
+            ) for src, dst, err in errors[:max_errors]]
+        if len(errors) > max_errors:
+            messages.append(_("%d more errors were not shown.") % (
+                len(errors) - max_errors))
+        return messages
+
+    def _copy_error_dialog(self, errors):
+        misc.error_dialog(_("Error copying file"),
+                          "\n\n".join(self._copy_error_messages(errors)))
+
+    def _copy_stopped_msg(self, copier, pane):
+        primary = _("Copying %s was stopped") % GLib.markup_escape_text(
+            os.path.basename(copier.src))
+        messages = [_("%d of %d files were copied. Copy the folder again to "
+                      "copy the remaining files.") % (
+                          copier.files_done, copier.files)]
+        messages.extend(self._copy_error_messages(copier.errors))
+        self.add_dismissable_msg(pane, Gtk.STOCK_DIALOG_WARNING, primary,
+                                 "\n\n".join(messages))
+
+    def _remove_scan_tasks(self):
+        """Stop any scans, leaving folder copies running"""
+        kept = [t for t in self.scheduler.tasks if t in self.copy_tasks or
+                t == self._schedule_folder_changes]
+        self.scheduler.remove_all_tasks()
+        for task in kept:
+            self.scheduler.add_task(task)
 
     def delete_selected(self):
         """Delete all selected files/folders recursively.
@@ -1184,7 +1238,9 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
             paths = self._get_selected_paths(pane)
             paths.reverse()
             for p in paths:
-                self.model.remove( self.model.get_iter(p) )
+                it = self.model.get_iter(p)
+                self._forget_rows(it)
+                self.model.remove(it)
 
         #
         # Selection
@@ -1197,22 +1253,41 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         # Filtering
         #
 
-    def _filter_on_state(self, roots, fileslist):
+    def _filter_on_state(self, roots, fileslist, stats=None, defer=False,
+                         keep=()):
         """Get state of 'files' for filtering purposes.
            Returns STATE_NORMAL, STATE_NEW or STATE_MODIFIED
 
                roots - array of root directories
                fileslist - array of filename tuples of length len(roots)
+               stats - optional dictionary of stat results by path
+               defer - whether to keep files needing a content comparison
+               keep - tuples of paths to keep without checking their state
         """
         assert len(roots) == self.model.ntree
         ret = []
         regexes = [f.filter for f in self.text_filters if f.active]
         for files in fileslist:
             curfiles = [ os.path.join( r, f ) for r,f in zip(roots,files) ]
-            is_present = [ os.path.exists( f ) for f in curfiles ]
+            if tuple(curfiles) in keep:
+                ret.append(files)
+                continue
+            if stats is not None:
+                curstats = [stats.get(f) for f in curfiles]
+                is_present = [s is not None for s in curstats]
+            else:
+                curstats = None
+                is_present = [ os.path.exists( f ) for f in curfiles ]
             all_present = 0 not in is_present
+            if (defer and all_present and curstats is not None and
+                    all(stat.S_ISREG(s.st_mode) for s in curstats)):
+                # The state isn't known until the comparison is done
+                ret.append(files)
+                continue
             if all_present:
-                if self.file_compare(curfiles, regexes) in (Same, SameFiltered):
+                result = self.file_compare(curfiles, regexes,
+                                           stat_results=curstats)
+                if result in (Same, SameFiltered):
                     state = tree.STATE_NORMAL
                 else:
                     state = tree.STATE_MODIFIED
@@ -1220,23 +1295,130 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
                 state = tree.STATE_NEW
             # Always retain NORMAL folders for comparison; we remove these
             # later if they have no children.
-            if (state in self.state_filters or
-                    all(os.path.isdir(f) for f in curfiles)):
+            if curstats is not None:
+                all_dirs = all(s is not None and stat.S_ISDIR(s.st_mode)
+                               for s in curstats)
+            else:
+                all_dirs = all(os.path.isdir(f) for f in curfiles)
+            if state in self.state_filters or all_dirs:
                 ret.append( files )
         return ret
 
-    def _update_item_state(self, it):
+    def _remove_filtered_row(self, it):
+        """Remove a row hidden by the state filters after it was added
+
+        As when scanning, folders left empty are shown as empty if normal
+        rows are shown, and are otherwise pruned along with any ancestors
+        that are then empty.
+        """
+        parent = self.model.iter_parent(it)
+        self._forget_rows(it)
+        self.model.remove(it)
+        while parent and not self.model.iter_has_child(parent):
+            grandparent = self.model.iter_parent(parent)
+            if (grandparent is None or
+                    tree.STATE_NORMAL in self.state_filters):
+                self.model.add_empty(parent)
+                break
+            self._forget_rows(parent)
+            self.model.remove(parent)
+            parent = grandparent
+
+    def _forget_rows(self, it):
+        """Drop the indexed paths and stats of a row about to be removed
+
+        The row's descendants, which are removed with it, are dropped too.
+        """
+        paths = tuple(self.model.value_paths(it))
+        self.row_stats.pop(paths, None)
+        for f in paths:
+            self.row_index.pop(f, None)
+        child = self.model.iter_children(it)
+        while child:
+            self._forget_rows(child)
+            child = self.model.iter_next(child)
+
+    def _stat_signature(self, files, known_stats):
+        return tuple(
+            StatItem._make(known_stats[f]) if f in known_stats else None
+            for f in files)
+
+    def _add_or_update_item(self, parent, files, known_stats, existing,
+                            position, pending=None):
+        """Add a scanned row, or update it if it's in 'existing'
+
+        Existing rows are only updated if their files' stat details have
+        changed since they were last scanned. Returns the row and whether
+        it has newly been found to differ.
+        """
+        key = tuple(files)
+        signature = self._stat_signature(files, known_stats)
+        child = existing.get(key)
+        if child is None:
+            child, different = self._add_item(
+                parent, files, known_stats, pending, position)
+        elif self.row_stats.get(key) != signature:
+            different = self._update_item_state(child, known_stats, pending)
+        else:
+            # Unchanged, so leave the row and its expansion state alone
+            different = False
+        self.row_stats[key] = signature
+        return child, different
+
+    def _update_item_state(self, it, known_stats=None, pending=None):
         """Update the state of the item at 'it'
+
+        If given, known_stats is a dictionary of stat results by path that
+        is used instead of stat-ing the item's files.
+
+        If 'pending' is a list, content comparisons are deferred; the item
+        is shown as unknown and its file paths appended to 'pending' for
+        updating later.
         """
         files = self.model.value_paths(it)
+        values, different, is_pending = self._get_item_state(
+            files, known_stats, pending is not None)
+        self.model.set(it, values)
+        if is_pending:
+            pending.append(tuple(files))
+        return different
+
+    def _add_item(self, parent, files, known_stats=None, pending=None,
+                  position=-1):
+        """Add a row for 'files' under 'parent', with its state set
+
+        This is equivalent to adding the row and then calling
+        _update_item_state() on it, but inserts the row with all of its
+        values at once. Returns the new row and whether it differs.
+        """
+        values, different, is_pending = self._get_item_state(
+            files, known_stats, pending is not None)
+        child = self.model.add_entries(parent, files, values, position)
+        path = self.model.get_path(child)
+        for f in files:
+            self.row_index[f] = path
+        if is_pending:
+            pending.append(tuple(self.model.value_paths(child)))
+        return child, different
+
+    def _get_item_state(self, files, known_stats=None, defer=False):
+        """Get the column values giving the state of 'files'
+
+        Returns a dictionary of column values, whether the files differ,
+        and whether their content comparison was deferred.
+        """
+        values = {}
+        col_idx = self.model.column_index
         regexes = [f.filter for f in self.text_filters if f.active]
 
-        def stat(f):
+        def get_stat(f):
+            if known_stats is not None:
+                return known_stats.get(f)
             try:
                 return os.stat(f)
             except OSError:
                 return None
-        stats = [stat(f) for f in files[:self.num_panes]]
+        stats = [get_stat(f) for f in files[:self.num_panes]]
         sizes = [s.st_size if s else 0 for s in stats]
         perms = [s.st_mode if s else 0 for s in stats]
 
@@ -1245,47 +1427,61 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         newest_index = mod_times.index( max(mod_times) )
         if mod_times.count( max(mod_times) ) == len(mod_times):
             newest_index = -1 # all same
+
+        def compare(files, stat_results):
+            if (defer and len(files) > 1 and
+                    all(stat.S_ISREG(s.st_mode) for s in stat_results)):
+                return None
+            return self.file_compare(files, regexes, stat_results=stat_results)
+
         all_present = 0 not in mod_times
         if all_present:
-            all_same = self.file_compare(files, regexes)
+            all_same = compare(files, stats)
             all_present_same = all_same
         else:
             lof = []
+            lof_stats = []
             for j in range(len(mod_times)):
                 if mod_times[j]:
                     lof.append( files[j] )
+                    lof_stats.append(stats[j])
             all_same = Different
-            all_present_same = self.file_compare(lof, regexes)
+            all_present_same = compare(lof, lof_stats)
+        is_pending = all_same is None or all_present_same is None
         different = 1
         one_isdir = [None for i in range(self.model.ntree)]
         for j in range(self.model.ntree):
             if mod_times[j]:
-                isdir = os.path.isdir( files[j] )
+                isdir = stat.S_ISDIR(stats[j].st_mode)
+                # Rows waiting on a comparison are shown as unknown
+                if is_pending:
+                    state = tree.STATE_NONE
+                    different = 0
                 # TODO: Differentiate the DodgySame case
-                if all_same == Same or all_same == DodgySame:
-                    self.model.set_path_state(it, j, tree.STATE_NORMAL, isdir)
+                elif all_same == Same or all_same == DodgySame:
+                    state = tree.STATE_NORMAL
                     different = 0
                 elif all_same == SameFiltered:
-                    self.model.set_path_state(it, j, tree.STATE_NOCHANGE, isdir)
+                    state = tree.STATE_NOCHANGE
                     different = 0
                 # TODO: Differentiate the SameFiltered and DodgySame cases
                 elif all_present_same in (Same, SameFiltered, DodgySame):
-                    self.model.set_path_state(it, j, tree.STATE_NEW, isdir)
+                    state = tree.STATE_NEW
                 elif all_same == FileError or all_present_same == FileError:
-                    self.model.set_path_state(it, j, tree.STATE_ERROR, isdir)
+                    state = tree.STATE_ERROR
                 # Different and DodgyDifferent
                 else:
-                    self.model.set_path_state(it, j, tree.STATE_MODIFIED, isdir)
-                self.model.set_value(it,
-                    self.model.column_index(COL_EMBLEM, j),
+                    state = tree.STATE_MODIFIED
+                values.update(
+                    self.model.path_state_values(files[j], j, state, isdir))
+                values[col_idx(COL_EMBLEM, j)] = (
                     j == newest_index and "emblem-meld-newer-file" or None)
                 one_isdir[j] = isdir
 
                 # A DateCellRenderer would be nicer, but potentially very slow
-                TIME = self.model.column_index(COL_TIME, j)
                 mod_datetime = datetime.datetime.fromtimestamp(mod_times[j])
                 time_str = mod_datetime.strftime("%a %d %b %Y %H:%M:%S")
-                self.model.set_value(it, TIME, time_str)
+                values[col_idx(COL_TIME, j)] = time_str
 
                 def natural_size(bytes):
                     suffixes = (
@@ -1300,9 +1496,7 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
                     return format_str % (size, suffixes[unit])
 
                 # A SizeCellRenderer would be nicer, but potentially very slow
-                SIZE = self.model.column_index(COL_SIZE, j)
-                size_str = natural_size(sizes[j])
-                self.model.set_value(it, SIZE, size_str)
+                values[col_idx(COL_SIZE, j)] = natural_size(sizes[j])
 
                 def format_mode(mode):
                     perms = []
@@ -1312,15 +1506,13 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
                         perms.extend([p if group & i else '-' for i, p in rwx])
                     return "".join(perms)
 
-                PERMS = self.model.column_index(COL_PERMS, j)
-                perm_str = format_mode(perms[j])
-                self.model.set_value(it, PERMS, perm_str)
+                values[col_idx(COL_PERMS, j)] = format_mode(perms[j])
 
         for j in range(self.model.ntree):
             if not mod_times[j]:
-                self.model.set_path_state(it, j, tree.STATE_NONEXIST,
-                                          True in one_isdir)
-        return different
+                values.update(self.model.path_state_values(
+                    files[j], j, tree.STATE_NONEXIST, True in one_isdir))
+        return values, different, is_pending
 
     def popup_in_pane(self, pane, event):
         for (treeview, inid, outid) in zip(self.treeview, self.focus_in_events, self.focus_out_events):
@@ -1448,40 +1640,194 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
         """When a file has changed, try to find it in our tree
            and update its status if necessary
         """
-        model = self.model
         changed_paths = []
-        # search each panes tree for changed_filename
         for pane in range(self.num_panes):
-            it = model.get_iter_first()
-            current = model.value_path(it, pane).split(os.sep)
-            changed = changed_filename.split(os.sep)
-            # early exit. does filename begin with root?
-            try:
-                if changed[:len(current)] != current:
-                    continue
-            except IndexError:
-                continue
-            changed = changed[len(current):]
-            # search the tree component at a time
-            for component in changed:
-                child = model.iter_children( it )
-                while child:
-                    child_path = model.value_path(child, pane)
-                    # Found the changed path
-                    if child_path and component == os.path.basename(child_path):
-                        it = child
-                        break
-                    child = self.model.iter_next(child)
-                if not it:
-                    break
+            it = self._find_row(changed_filename, pane)
             # save if found and unique
             if it:
-                path = model.get_path(it)
+                path = self.model.get_path(it)
                 if path not in changed_paths:
                     changed_paths.append(path)
         # do the update
         for path in changed_paths:
-            self._update_item_state( model.get_iter(path) )
+            self._update_item_state(self.model.get_iter(path))
+
+    def on_live_comparison_changed(self, *args):
+        if self.props.live_comparison:
+            # Monitors are added as folders are scanned
+            self.refresh()
+        else:
+            self._remove_folder_monitors()
+
+    def _add_folder_monitor(self, folder, pane):
+        if folder in self.folder_monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(folder).monitor_directory(
+                Gio.FileMonitorFlags.NONE, None)
+        except GLib.GError:
+            return
+        handler_id = monitor.connect(
+            'changed', self.on_folder_monitor_changed, pane)
+        self.folder_monitors[folder] = monitor, handler_id
+
+    def _remove_folder_monitors(self, folder=None):
+        """Stop monitoring 'folder' and its subfolders, or all folders"""
+        for path in list(self.folder_monitors):
+            if (folder is not None and path != folder and
+                    not path.startswith(folder + os.sep)):
+                continue
+            monitor, handler_id = self.folder_monitors.pop(path)
+            monitor.disconnect(handler_id)
+            monitor.cancel()
+        if folder is None:
+            self.monitor_events.clear()
+            if self.monitor_timeout is not None:
+                GLib.source_remove(self.monitor_timeout)
+                self.monitor_timeout = None
+
+    def on_folder_monitor_changed(self, monitor, f, other_file, event_type,
+                                  pane):
+        if event_type == Gio.FileMonitorEvent.CREATED:
+            kind = "created"
+        elif event_type == Gio.FileMonitorEvent.DELETED:
+            kind = "deleted"
+        elif event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+                            Gio.FileMonitorEvent.ATTRIBUTE_CHANGED):
+            kind = "changed"
+        else:
+            return
+
+        path = f.get_path()
+        if not isinstance(path, unicode):
+            path = path.decode('utf8', 'replace')
+        self.monitor_events.setdefault((path, pane), set()).add(kind)
+        self._schedule_folder_changes()
+
+    def _schedule_folder_changes(self):
+        if self.monitor_timeout is None:
+            self.monitor_timeout = GLib.timeout_add(
+                MONITOR_DELAY, self._apply_folder_changes)
+
+    def _apply_folder_changes(self):
+        """Update rows for the folder changes collected since the last call
+
+        Changes to the same file are coalesced. Created entries cause
+        their parent folder to be rescanned, once per folder; deleted and
+        modified entries only update their own rows.
+        """
+        self.monitor_timeout = None
+        # Don't change rows while a scan is still using their paths; try
+        # again once the current tasks have finished.
+        if self.scheduler.tasks_pending():
+            self.scheduler.add_task(self._schedule_folder_changes)
+            return False
+        events, self.monitor_events = self.monitor_events, {}
+
+        rescan = set()
+        update = []
+        for (path, pane), kinds in events.items():
+            if "created" in kinds:
+                rescan.add((os.path.dirname(path), pane))
+            elif "deleted" in kinds:
+                self._remove_folder_monitors(path)
+                update.append((path, pane))
+            else:
+                update.append((path, pane))
+
+        # Rescanning a folder also refreshes everything below it
+        folders = set(p for p, pane in rescan)
+        def is_covered(path):
+            parent = os.path.dirname(path)
+            while parent and parent != path:
+                if parent in folders:
+                    return True
+                path, parent = parent, os.path.dirname(parent)
+            return False
+
+        for path, pane in update:
+            if is_covered(path):
+                continue
+            it = self._find_row(path, pane)
+            if it is None or self.model.value_path(it, pane) != path:
+                continue
+            if os.path.lexists(path):
+                self._update_item_state(it)
+            else:
+                self.file_deleted(self.model.get_path(it), pane)
+
+        for folder, pane in rescan:
+            if is_covered(folder):
+                continue
+            it = self._find_row(folder, pane)
+            if it is None or self.model.value_path(it, pane) != folder:
+                continue
+            self.recursively_update(self.model.get_path(it), incremental=True)
+
+        self._update_diffmaps()
+        return False
+
+    def _find_row(self, filename, pane):
+        """Find the row showing 'filename' in 'pane'
+
+        If there is no such row, the row of its closest listed ancestor
+        folder is returned instead.
+
+        Rows are looked up in row_index, which maps file paths to tree
+        paths as recorded while scanning. Rows move when others are
+        removed, so indexed paths are checked and, if stale, we fall back
+        to searching the tree. A removal moves all of a row's later
+        siblings, so the search re-indexes every sibling it passes rather
+        than only the result. Tree paths are used instead of
+        TreeRowReferences, as every reference is updated on every row
+        insertion or deletion, making scans quadratic.
+        """
+        model = self.model
+        path = self.row_index.get(filename)
+        if path is not None:
+            try:
+                it = model.get_iter(path)
+            except ValueError:
+                it = None
+            if it and model.value_path(it, pane) == filename:
+                return it
+
+        it = model.get_iter_first()
+        current = model.value_path(it, pane).split(os.sep)
+        changed = filename.split(os.sep)
+        # early exit. does filename begin with root?
+        if changed[:len(current)] != current:
+            return None
+        changed = changed[len(current):]
+        # search the tree component at a time
+        for component in changed:
+            child = model.iter_children( it )
+            found = None
+            while child:
+                self._index_row(child)
+                child_path = model.value_path(child, pane)
+                # Found the changed path
+                if (found is None and child_path and
+                        component == os.path.basename(child_path)):
+                    found = child
+                child = model.iter_next(child)
+            if not found:
+                return it
+            it = found
+        return it
+
+    def _index_row(self, it):
+        path = self.model.get_path(it)
+        for f in self.model.value_paths(it):
+            if f is not None:
+                self.row_index[f] = path
+
+    def _find_pending_row(self, files):
+        """Find the row for 'files', or None if it has been removed"""
+        it = self._find_row(files[0], 0)
+        if it is None or tuple(self.model.value_paths(it)) != files:
+            return None
+        return it
 
     def next_diff(self, direction):
         if self.focus_pane:
@@ -1497,11 +1843,23 @@ class DirDiff(melddoc.MeldDoc, gnomeglade.Component):
             self.treeview[pane].set_cursor(path)
 
     def on_refresh_activate(self, *extra):
-        self.on_fileentry_file_set(None)
+        root = self.model.get_iter_first()
+        files = [e.get_file() for e in self.fileentry[:self.num_panes]]
+        locations = [f.get_path() if f else None for f in files]
+        for i, l in enumerate(locations):
+            if l is not None and not isinstance(l, unicode):
+                locations[i] = l.decode('utf8', 'replace')
+        if root and locations == self.model.value_paths(root):
+            # Same folders as before, so only update what's changed
+            self._remove_scan_tasks()
+            self.recursively_update(Gtk.TreePath.new_first(), incremental=True)
+        else:
+            self.on_fileentry_file_set(None)
 
     def on_delete_event(self, appquit=0):
         for h in self.settings_handlers:
             meldsettings.disconnect(h)
+        self._remove_folder_monitors()
         self.emit('close', 0)
         return Gtk.ResponseType.OK
 
@@ -16,9 +16,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
 import copy
 import functools
 import io
+import logging
 import os
 import time
 
@@ -50,6 +52,8 @@ from meld.settings import bind_settings, meldsettings, settings
 from .util.compat import text_type
 from meld.sourceview import LanguageManager
 
+log = logging.getLogger(__name__)
+
 
 class CachedSequenceMatcher(object):
     """Simple class for caching diff results, with LRU-based eviction
@@ -220,8 +224,13 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
         ]
         self.buffer_filtered = [meldbuffer.BufferLines(b, self._filter_text)
                                 for b in self.textbuffer]
+        # Per-pane cache of chunk pixel extents in buffer coordinates, used
+        # for culling chunks when drawing the text views.
+        self._chunk_geometry = [None, None, None]
         for (i, w) in enumerate(self.scrolledwindow):
             w.get_vadjustment().connect("value-changed", self._sync_vscroll, i)
+            w.get_vadjustment().connect("changed",
+                                        self._invalidate_chunk_geometry)
             w.get_hadjustment().connect("value-changed", self._sync_hscroll)
         self._connect_buffer_handlers()
         self._sync_vscroll_lock = False
@@ -336,6 +345,8 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
             t.connect("focus-in-event", self.on_current_diff_changed)
             t.connect("focus-out-event", self.on_current_diff_changed)
         self.linediffer.connect("diffs-changed", self.on_diffs_changed)
+        self.linediffer.connect("diffs-changed",
+                                self._invalidate_chunk_geometry)
         self.undosequence.connect("checkpointed", self.on_undo_checkpointed)
         self.connect("next-conflict-changed", self.on_next_conflict_changed)
 
@@ -794,6 +805,8 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
             if not self.linediffer.syncpoints:
                 self.linediffer.change_sequence(pane, startline, sizechange,
                                                 self.buffer_filtered)
+            else:
+                self._invalidate_chunk_geometry()
             # FIXME: diff-changed signal for the current buffer would be cleaner
             focused_pane = self._get_focused_pane()
             if focused_pane != -1:
@@ -844,6 +857,7 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
         self.pixels_per_line = line_height_points // 1024
         for i in range(3):
             self.textview[i].override_font(meldsettings.font)
+        self._invalidate_chunk_geometry()
         for i in range(2):
             self.linkmap[i].queue_draw()
 
@@ -1495,10 +1509,39 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
             self.text_filters = []
             self.refresh_comparison()
 
+    def _invalidate_chunk_geometry(self, *args):
+        self._chunk_geometry = [None, None, None]
+
+    def _get_chunk_geometry(self, pane):
+        """Get the pixel extents of all chunks in the given pane
+
+        Returns a tuple of a list of chunk bottom y-coordinates (suitable for
+        bisection) and a list of (top, bottom, tag, chunk index) tuples, all
+        in buffer coordinates. Results are cached until the chunks or the
+        view's layout change.
+        """
+        geometry = self._chunk_geometry[pane]
+        if geometry is None:
+            get_y = self.textview[pane].get_y_for_line_num
+            locate_chunk = self.linediffer.locate_chunk
+            chunks = []
+            for change in self.linediffer.single_changes(pane):
+                chunk_index = locate_chunk(pane, change[1])[0]
+                if change[1] == change[2]:
+                    ypos0 = ypos1 = get_y(change[1])
+                else:
+                    ypos0, ypos1 = get_y(change[1]), get_y(change[2])
+                chunks.append((ypos0, ypos1, change[0], chunk_index))
+            geometry = ([c[1] for c in chunks], chunks)
+            self._chunk_geometry[pane] = geometry
+        return geometry
+
     def on_textview_draw(self, textview, context):
         if self.num_panes == 1:
             return
 
+        draw_start = GLib.get_monotonic_time()
+
         # FIXME: Update to use gtk_cairo_should_draw_window()
 
         # if event.window != textview.get_window(Gtk.TextWindowType.TEXT) \
@@ -1523,20 +1566,26 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
         width, height = view_allocation.width, view_allocation.height
         context.set_line_width(1.0)
 
-        for change in self.linediffer.single_changes(pane, bounds):
-            ypos0 = textview.get_y_for_line_num(change[1]) - visible.y
-            ypos1 = textview.get_y_for_line_num(change[2]) - visible.y
+        # Only draw the chunks that intersect with the visible area
+        chunk_ends, chunks = self._get_chunk_geometry(pane)
+        first_chunk = bisect.bisect_left(chunk_ends, y)
+        y_end = y + height + 1
+        for ypos0, ypos1, tag, chunk_index in chunks[first_chunk:]:
+            if ypos0 > y_end:
+                break
+            ypos0 -= visible.y
+            ypos1 -= visible.y
 
             context.rectangle(-0.5, ypos0 - 0.5, width + 1, ypos1 - ypos0)
-            if change[1] != change[2]:
-                context.set_source_rgba(*self.fill_colors[change[0]])
+            if ypos0 != ypos1:
+                context.set_source_rgba(*self.fill_colors[tag])
                 context.fill_preserve()
-                if self.linediffer.locate_chunk(pane, change[1])[0] == self.cursor.chunk:
+                if chunk_index == self.cursor.chunk:
                     h = self.fill_colors['current-chunk-highlight']
                     context.set_source_rgba(h.red, h.green, h.blue, 0.5)
                     context.fill_preserve()
 
-            context.set_source_rgba(*self.line_colors[change[0]])
+            context.set_source_rgba(*self.line_colors[tag])
             context.stroke()
 
         if (self.props.highlight_current_line and textview.is_focus() and
@@ -1596,6 +1645,10 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
             GLib.source_remove(self.anim_source_id[pane])
             self.anim_source_id[pane] = None
 
+        if log.isEnabledFor(logging.DEBUG):
+            draw_time = (GLib.get_monotonic_time() - draw_start) / 1000.
+            log.debug("Drew pane %d in %.2fms", pane, draw_time)
+
         # if event.window == textview.get_window(Gtk.TextWindowType.LEFT):
         #     self.in_nested_textview_gutter_expose = True
         #     textview.emit("expose-event", event)
@@ -1852,18 +1905,16 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
                 mbegin, mend = 0, self.textbuffer[master].get_line_count()
                 obegin, oend = 0, self.textbuffer[i].get_line_count()
                 # look for the chunk containing 'line'
-                for c in self.linediffer.pair_changes(master, i):
+                prev_c, c = self.linediffer.locate_pair_change(master, i, line)
+                if prev_c is not None:
+                    mbegin, obegin = prev_c[2], prev_c[4]
+                if c is not None:
                     if c[1] >= line:
                         mend = c[1]
                         oend = c[3]
-                        break
-                    elif c[2] >= line:
+                    else:
                         mbegin, mend = c[1], c[2]
                         obegin, oend = c[3], c[4]
-                        break
-                    else:
-                        mbegin = c[2]
-                        obegin = c[4]
                 fraction = (line - mbegin) / ((mend - mbegin) or 1)
                 other_line = (obegin + fraction * (oend - obegin))
                 it = self.textbuffer[i].get_iter_at_line(int(other_line))
@@ -1900,11 +1951,25 @@ class FileDiff(melddoc.MeldDoc, gnomeglade.Component):
 
             def coords_iter(i):
                 buf_index = 2 if i == 1 and self.num_panes == 3 else i
-                get_end_iter = self.textbuffer[buf_index].get_end_iter
-                get_iter_at_line = self.textbuffer[buf_index].get_iter_at_line
-                get_line_yrange = self.textview[buf_index].get_line_yrange
+                textview = self.textview[buf_index]
+                textbuffer = self.textbuffer[buf_index]
+                get_end_iter = textbuffer.get_end_iter
+                get_iter_at_line = textbuffer.get_iter_at_line
+                get_line_yrange = textview.get_line_yrange
+
+                def coords_by_line():
+                    # Without wrapping, every line has the same height, so
+                    # positions can be calculated directly from line numbers.
+                    max_line = float(textbuffer.get_line_count())
+                    for c in self.linediffer.single_changes(i):
+                        yield c[0], c[1] / max_line, c[2] / max_line
 
                 def coords_by_chunk():
+                    if textview.get_wrap_mode() == Gtk.WrapMode.NONE:
+                        for coords in coords_by_line():
+                            yield coords
+                        return
+
                     y, h = get_line_yrange(get_end_iter())
                     max_y = float(y + h)
                     for c in self.linediffer.single_changes(i):
@@ -15,7 +15,55 @@
 
 import re
 
-from . import misc
+
+def shell_to_regex(pat):
+    """Translate a shell PATTERN to a regular expression.
+
+    Based on fnmatch.translate(). We also handle {a,b,c} where fnmatch does not.
+    """
+
+    i, n = 0, len(pat)
+    res = ''
+    while i < n:
+        c = pat[i]
+        i += 1
+        if c == '\\':
+            try:
+                c = pat[i]
+            except IndexError:
+                pass
+            else:
+                i += 1
+                res += re.escape(c)
+        elif c == '*':
+            res += '.*'
+        elif c == '?':
+            res += '.'
+        elif c == '[':
+            try:
+                j = pat.index(']', i)
+            except ValueError:
+                res += r'\['
+            else:
+                stuff = pat[i:j]
+                i = j+1
+                if stuff[0] == '!':
+                    stuff = '^%s' % stuff[1:]
+                elif stuff[0] == '^':
+                    stuff = r'\^%s' % stuff[1:]
+                res += '[%s]' % stuff
+        elif c == '{':
+            try:
+                j = pat.index('}', i)
+            except ValueError:
+                res += '\\{'
+            else:
+                stuff = pat[i:j]
+                i = j+1
+                res += '(%s)' % "|".join([shell_to_regex(p)[:-1] for p in stuff.split(",")])
+        else:
+            res += re.escape(c)
+    return res + "$"
 
 
 class FilterEntry(object):
@@ -42,10 +90,10 @@ class FilterEntry(object):
     def _compile_shell_pattern(cls, pattern):
         bits = pattern.split()
         if len(bits) > 1:
-            regexes = [misc.shell_to_regex(b)[:-1] for b in bits]
+            regexes = [shell_to_regex(b)[:-1] for b in bits]
             regex = "(%s)$" % "|".join(regexes)
         elif len(bits):
-            regex = misc.shell_to_regex(bits[0])
+            regex = shell_to_regex(bits[0])
         else:
             # An empty pattern would match everything, so skip it
             return None
@@ -92,3 +140,53 @@ class FilterEntry(object):
         if self.filter is not None:
             new.filter = re.compile(self.filter.pattern, self.filter.flags)
         return new
+
+
+class NameFilterMatcher(object):
+    """Match names against a set of shell patterns in one step
+
+    Patterns are split into their space-separated globs, as in FilterEntry.
+    Literal names are matched by set lookup, and 'prefix*' and '*suffix'
+    globs with str.startswith() and str.endswith(). Everything else is
+    combined into a single regex.
+    """
+
+    glob_chars = re.compile(r"[\\*?[{]")
+
+    def __init__(self, patterns):
+        self.names = set()
+        prefixes, suffixes = set(), set()
+        regexes = []
+        for pattern in patterns:
+            if isinstance(pattern, bytes):
+                pattern = pattern.decode("utf8", "replace")
+            for bit in pattern.split():
+                if not self.glob_chars.search(bit):
+                    self.names.add(bit)
+                elif (bit.startswith("*") and len(bit) > 1 and
+                        not self.glob_chars.search(bit[1:])):
+                    suffixes.add(bit[1:])
+                elif (bit.endswith("*") and len(bit) > 1 and
+                        not self.glob_chars.search(bit[:-1])):
+                    prefixes.add(bit[:-1])
+                else:
+                    regexes.append(shell_to_regex(bit)[:-1])
+        self.prefixes = tuple(prefixes)
+        self.suffixes = tuple(suffixes)
+        self.regex = None
+        if regexes:
+            self.regex = re.compile("(%s)$" % "|".join(regexes))
+
+    def match(self, name):
+        """Whether name matches any of the patterns"""
+        try:
+            if name in self.names:
+                return True
+            if self.prefixes and name.startswith(self.prefixes):
+                return True
+            if self.suffixes and name.endswith(self.suffixes):
+                return True
+        except UnicodeDecodeError:
+            # Undecodable byte string names can only match the regex
+            pass
+        return self.regex is not None and self.regex.match(name) is not None
@@ -63,18 +63,47 @@ class GutterRendererChunkAction(GtkSource.GutterRendererPixbuf):
         self.filediff.connect("action-mode-changed",
                               self.on_container_mode_changed)
 
+        # Map of chunk start lines to chunks, and a lazily-filled map of
+        # chunk start lines to the action for that chunk.
+        self.chunk_starts = {}
+        self.action_cache = {}
+        self.linediffer.connect("diffs-changed", self.on_diffs_changed)
+        for view in self.views:
+            view.connect("notify::editable", self.on_view_editable_changed)
+
+    def on_diffs_changed(self, linediffer, chunk_changes):
+        chunk_starts = {}
+        for index in range(linediffer.diff_count()):
+            # FIXME: This is all chunks, not just those shared with to_pane
+            chunk = linediffer.get_chunk(index, self.from_pane)
+            if chunk is not None:
+                chunk_starts[chunk[1]] = chunk
+        self.chunk_starts = chunk_starts
+        self.action_cache = {}
+
+    def on_view_editable_changed(self, view, pspec):
+        self.action_cache = {}
+        self.queue_draw()
+
+    def _get_action(self, line):
+        """Get the action for the chunk starting at line, if any"""
+        try:
+            return self.action_cache[line]
+        except KeyError:
+            chunk = self.chunk_starts.get(line)
+            action = None
+            if chunk is not None:
+                action = self._classify_change_actions(chunk)
+            self.action_cache[line] = action
+            return action
+
     def do_activate(self, start, area, event):
         line = start.get_line()
-        chunk_index = self.linediffer.locate_chunk(self.from_pane, line)[0]
-        if chunk_index is None:
-            return
-
-        # FIXME: This is all chunks, not just those shared with to_pane
-        chunk = self.linediffer.get_chunk(chunk_index, self.from_pane)
-        if chunk[1] != line:
+        chunk = self.chunk_starts.get(line)
+        if chunk is None:
             return
 
-        action = self._classify_change_actions(chunk)
+        action = self._get_action(line)
         if action == MODE_DELETE:
             self.filediff.delete_chunk(self.from_pane, chunk)
         elif action == MODE_INSERT:
@@ -106,26 +135,10 @@ class GutterRendererChunkAction(GtkSource.GutterRendererPixbuf):
         return copy_menu
 
     def do_query_activatable(self, start, area, event):
-        line = start.get_line()
-        chunk_index = self.linediffer.locate_chunk(self.from_pane, line)[0]
-        if chunk_index is not None:
-            # FIXME: This is all chunks, not just those shared with to_pane
-            chunk = self.linediffer.get_chunk(chunk_index, self.from_pane)
-            if chunk[1] == line:
-                return True
-        return False
+        return start.get_line() in self.chunk_starts
 
     def do_query_data(self, start, end, state):
-        line = start.get_line()
-        chunk_index = self.linediffer.locate_chunk(self.from_pane, line)[0]
-
-        pixbuf = None
-        if chunk_index is not None:
-            chunk = self.linediffer.get_chunk(chunk_index, self.from_pane)
-            # FIXME: This is all chunks, not just those shared with to_pane
-            if chunk[1] == line:
-                action = self._classify_change_actions(chunk)
-                pixbuf = self.action_map.get(action)
+        pixbuf = self.action_map.get(self._get_action(start.get_line()))
         if pixbuf:
             self.set_pixbuf(pixbuf)
         else:
@@ -133,6 +146,7 @@ class GutterRendererChunkAction(GtkSource.GutterRendererPixbuf):
 
     def on_container_mode_changed(self, container, mode):
         self.mode = mode
+        self.action_cache = {}
         self.queue_draw()
 
     def _classify_change_actions(self, change):
@@ -0,0 +1,211 @@
+# Copyright (C) 2014 Kai Willadsen <kai.willadsen@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 2 of the License, or (at
+# your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+File comparison and merging without a user interface
+
+This runs the same matchers, Differ and Merger as file comparisons, for
+"meld --headless-diff" and "meld --headless-merge". GTK+ is never
+imported, so these start quickly and don't need a display.
+
+Files are handled as bytes, so their encodings are kept as they are.
+Merge results are written with the base file's line endings; if it has a
+mixture, the most common one is used.
+"""
+
+from __future__ import print_function
+
+import collections
+import io
+import optparse
+import sys
+
+from . import diffutil
+from . import merge
+
+
+def read_lines(path):
+    """Read a file, returning its lines with and without line endings"""
+    with io.open(path, "rb") as f:
+        text = f.read()
+    return text.splitlines(True), text.splitlines()
+
+
+def line_ending(lines):
+    """Get the most common line ending of lines, defaulting to '\n'"""
+    endings = collections.Counter(
+        line[len(line.rstrip(b"\r\n")):] for line in lines)
+    endings.pop(b"", None)
+    if not endings:
+        return b"\n"
+    return endings.most_common(1)[0][0]
+
+
+def _run(task):
+    """Run a Differ or Merger task iterator, returning its last result"""
+    result = None
+    for result in task:
+        pass
+    return result
+
+
+def diff_files(texts):
+    """Get the changes from texts[0] to texts[1] as DiffChunks"""
+    differ = diffutil.Differ()
+    _run(differ.set_sequences_iter(texts))
+    return list(differ.pair_changes(0, 1))
+
+
+def _format_range(start, stop):
+    """Format a hunk range as in difflib.unified_diff"""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return "%d" % beginning
+    if not length:
+        beginning -= 1
+    return "%d,%d" % (beginning, length)
+
+
+def unified_diff(a, b, chunks, fromfile, tofile, n=3):
+    """Yield the lines of a unified diff built from chunks
+
+    a and b are lists of lines including their line endings, and chunks
+    are the changes from a to b, as from diff_files(). Each hunk has up to
+    n lines of context.
+    """
+    if not chunks:
+        return
+
+    yield b"--- %s\n" % fromfile
+    yield b"+++ %s\n" % tofile
+
+    def lines(prefix, seq, start, end):
+        for line in seq[start:end]:
+            yield prefix + line
+            if not line.endswith((b"\n", b"\r")):
+                yield b"\n\\ No newline at end of file\n"
+
+    groups = [[chunks[0]]]
+    for chunk in chunks[1:]:
+        if chunk.start_a - groups[-1][-1].end_a > 2 * n:
+            groups.append([])
+        groups[-1].append(chunk)
+
+    for group in groups:
+        first, last = group[0], group[-1]
+        # Lines between changes are the same in both files, so context
+        # lines are counted and taken from a.
+        before = min(n, first.start_a)
+        after = min(n, len(a) - last.end_a)
+        a_start, a_end = first.start_a - before, last.end_a + after
+        b_start, b_end = first.start_b - before, last.end_b + after
+        yield b"@@ -%s +%s @@\n" % (_format_range(a_start, a_end),
+                                    _format_range(b_start, b_end))
+        position = a_start
+        for chunk in group:
+            for line in lines(b" ", a, position, chunk.start_a):
+                yield line
+            for line in lines(b"-", a, chunk.start_a, chunk.end_a):
+                yield line
+            for line in lines(b"+", b, chunk.start_b, chunk.end_b):
+                yield line
+            position = chunk.end_a
+        for line in lines(b" ", a, position, a_end):
+            yield line
+
+
+def merge_files(texts, mark_conflicts=True):
+    """Merge three texts, with the common ancestor in the middle
+
+    Returns the merged text and the number of unresolved conflicts.
+    """
+    merger = merge.Merger()
+    _run(merger.initialize(texts, texts))
+    merged = _run(merger.merge_3_files(mark_conflicts))
+    return merged, len(merger.unresolved)
+
+
+def main(args):
+    """Diff or merge files from the command line, returning an exit status
+
+    For diffs, the status is 0 if the files are the same and 1 if they
+    differ. For merges, it is 0 if the merge was clean and 1 if there were
+    conflicts. In both cases, 2 means there was an error.
+    """
+    from meld.conf import _
+
+    parser = optparse.OptionParser(
+        usage=_("%prog --headless-diff FILE1 FILE2\n"
+                "       %prog --headless-merge LOCAL BASE REMOTE -o OUTPUT"),
+        description=_("Compare or merge files without starting the user "
+                      "interface"))
+    parser.add_option(
+        "--headless-diff", action="store_true",
+        help=_("Print a unified diff of two files"))
+    parser.add_option(
+        "--headless-merge", action="store_true",
+        help=_("Merge three files, writing the result to OUTPUT"))
+    parser.add_option(
+        "-o", "--output", metavar="OUTPUT",
+        help=_("Set the target file for saving a merge result"))
+    parser.add_option(
+        "-U", "--unified", type="int", default=3, metavar="NUM",
+        help=_("Show NUM lines of context in diffs"))
+    options, files = parser.parse_args(args)
+
+    if options.headless_diff == options.headless_merge:
+        parser.error(_("Exactly one of --headless-diff and --headless-merge "
+                       "must be given"))
+    num_files = 2 if options.headless_diff else 3
+    if len(files) != num_files:
+        parser.error(_("Wrong number of arguments (Got %i)") % len(files))
+    if options.headless_merge and not options.output:
+        parser.error(_("A merge needs an output file (-o)"))
+
+    try:
+        contents = [read_lines(f) for f in files]
+    except (IOError, OSError) as err:
+        print(_("Couldn't read %s: %s") % (err.filename, err.strerror),
+              file=sys.stderr)
+        return 2
+    lines = [c[0] for c in contents]
+    texts = [c[1] for c in contents]
+
+    if options.headless_diff:
+        stdout = getattr(sys.stdout, "buffer", sys.stdout)
+        # Lines are compared along with their endings, so that the diff
+        # also applies cleanly with patch.
+        chunks = diff_files(lines)
+        for line in unified_diff(lines[0], lines[1], chunks, files[0],
+                                 files[1], options.unified):
+            stdout.write(line)
+        return 1 if chunks else 0
+
+    merged, conflicts = merge_files(texts)
+    newline = line_ending(lines[1])
+    if newline != b"\n":
+        merged = merged.replace(b"\n", newline)
+    # Keep a final newline if the base file has one
+    if lines[1] and lines[1][-1].endswith((b"\n", b"\r")):
+        merged += newline
+    try:
+        with io.open(options.output, "wb") as f:
+            f.write(merged)
+    except (IOError, OSError) as err:
+        print(_("Couldn't write %s: %s") % (err.filename, err.strerror),
+              file=sys.stderr)
+        return 2
+    return 1 if conflicts else 0
@@ -15,6 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import bisect
 import math
 
 from gi.repository import Gtk
@@ -26,8 +27,13 @@ class LinkMap(Gtk.DrawingArea):
 
     def __init__(self):
         self._setup = False
+        self._handlers = []
+        self._cached_changes = None
 
     def associate(self, filediff, left_view, right_view):
+        for (o, h) in self._handlers:
+            o.disconnect(h)
+
         self.filediff = filediff
         self.views = [left_view, right_view]
         if self.get_direction() == Gtk.TextDirection.RTL:
@@ -38,8 +44,44 @@ class LinkMap(Gtk.DrawingArea):
 
         self.line_height = filediff.pixels_per_line
 
+        # Chunk geometry is cached in buffer coordinates, so it only needs to
+        # be recalculated when the chunks or the views' layouts change.
+        linediffer = filediff.linediffer
+        self._handlers = [(linediffer, linediffer.connect(
+            "diffs-changed", self.on_geometry_changed))]
+        for view in self.views:
+            adj = view.get_vadjustment()
+            self._handlers.append(
+                (adj, adj.connect("changed", self.on_geometry_changed)))
+        self._cached_changes = None
+
         self._setup = True
 
+    def on_geometry_changed(self, *args):
+        self._cached_changes = None
+
+    def _get_cached_changes(self):
+        """Get the buffer y-coordinates of all changes between our views
+
+        Returns a tuple of lists of the bottom y-coordinates of each change
+        in the left and right views (for bisection), and a list of
+        (tag, left top, left bottom, right top, right bottom, chunk index)
+        tuples.
+        """
+        if self._cached_changes is None:
+            left, right = self.view_indices
+            linediffer = self.filediff.linediffer
+            get_y = [v.get_y_for_line_num for v in self.views]
+            changes = []
+            for c in linediffer.pair_changes(left, right):
+                f0, f1 = [get_y[0](l) for l in c[1:3]]
+                t0, t1 = [get_y[1](l) for l in c[3:5]]
+                chunk_idx = linediffer.locate_chunk(left, c[1])[0]
+                changes.append((c[0], f0, f1, t0, t1, chunk_idx))
+            self._cached_changes = ([c[2] for c in changes],
+                                    [c[4] for c in changes], changes)
+        return self._cached_changes
+
     def set_color_scheme(self, color_map):
         self.fill_colors, self.line_colors = color_map
         self.queue_draw()
@@ -61,10 +103,6 @@ class LinkMap(Gtk.DrawingArea):
         context.clip()
 
         height = allocation.height
-        visible = [self.views[0].get_line_num_for_y(pix_start[0]),
-                   self.views[0].get_line_num_for_y(pix_start[0] + height),
-                   self.views[1].get_line_num_for_y(pix_start[1]),
-                   self.views[1].get_line_num_for_y(pix_start[1] + height)]
 
         wtotal = allocation.width
         # For bezier control points
@@ -73,13 +111,23 @@ class LinkMap(Gtk.DrawingArea):
         radius = self.line_height // 3
         q_rad = math.pi / 2
 
-        left, right = self.view_indices
-        view_offset_line = lambda v, l: (self.views[v].get_y_for_line_num(l) -
-                                         pix_start[v] + y_offset[v])
-        for c in self.filediff.linediffer.pair_changes(left, right, visible):
+        # Scrolling only alters the offsets applied to our cached geometry
+        f_offset = y_offset[0] - pix_start[0]
+        t_offset = y_offset[1] - pix_start[1]
+
+        # Start at the first change visible in either view
+        f_ends, t_ends, changes = self._get_cached_changes()
+        start = min(bisect.bisect_left(f_ends, pix_start[0]),
+                    bisect.bisect_left(t_ends, pix_start[1]))
+        for tag, f0, f1, t0, t1, chunk_idx in changes[start:]:
             # f and t are short for "from" and "to"
-            f0, f1 = [view_offset_line(0, l) for l in c[1:3]]
-            t0, t1 = [view_offset_line(1, l) for l in c[3:5]]
+            f0, f1 = f0 + f_offset, f1 + f_offset
+            t0, t1 = t0 + t_offset, t1 + t_offset
+
+            # Changes are ordered, so once both ends are below the visible
+            # area, all subsequent changes are too.
+            if f0 > height and t0 > height:
+                break
 
             # If either endpoint is completely off-screen, we cull for clarity
             if (t0 < 0 and t1 < 0) or (t0 > height and t1 > height):
@@ -107,17 +155,16 @@ class LinkMap(Gtk.DrawingArea):
                                  x_steps[0], f1 - 0.5)
                 context.close_path()
 
-            context.set_source_rgba(*self.fill_colors[c[0]])
+            context.set_source_rgba(*self.fill_colors[tag])
             context.fill_preserve()
 
-            chunk_idx = self.filediff.linediffer.locate_chunk(left, c[1])[0]
             if chunk_idx == self.filediff.cursor.chunk:
                 h = self.fill_colors['current-chunk-highlight']
                 context.set_source_rgba(
                     h.red, h.green, h.blue, 0.5)
                 context.fill_preserve()
 
-            context.set_source_rgba(*self.line_colors[c[0]])
+            context.set_source_rgba(*self.line_colors[tag])
             context.stroke()
 
     def do_scroll_event(self, event):
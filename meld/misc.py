@@ -19,8 +19,6 @@
 """
 
 import os
-import errno
-import shutil
 import re
 import subprocess
 
@@ -298,109 +296,7 @@ def commonprefix(dirs):
                 break
     return os.sep.join(prefix)
 
-def copy2(src, dst):
-    """Like shutil.copy2 but ignores chmod errors, and copies symlinks as links
-    See [Bug 568000] Copying to NTFS fails
-    """
-    if os.path.isdir(dst):
-        dst = os.path.join(dst, os.path.basename(src))
-
-    if os.path.islink(src) and os.path.isfile(src):
-        if os.path.lexists(dst):
-            os.unlink(dst)
-        os.symlink(os.readlink(src), dst)
-    elif os.path.isfile(src):
-        shutil.copyfile(src, dst)
-    else:
-        raise OSError("Not a file")
-
-    try:
-        shutil.copystat(src, dst)
-    except OSError as e:
-        if e.errno != errno.EPERM:
-            raise
-
-def copytree(src, dst):
-    """Similar to shutil.copytree, but always copies symlinks and doesn't
-    error out if the destination path already exists.
-    """
-    # If the source tree is a symlink, duplicate the link and we're done.
-    if os.path.islink(src):
-        os.symlink(os.readlink(src), dst)
-        return
-
-    try:
-        os.mkdir(dst)
-    except OSError as e:
-        if e.errno != errno.EEXIST:
-            raise
-    names = os.listdir(src)
-    for name in names:
-        srcname = os.path.join(src, name)
-        dstname = os.path.join(dst, name)
-        if os.path.islink(srcname):
-            os.symlink(os.readlink(srcname), dstname)
-        elif os.path.isdir(srcname):
-            copytree(srcname, dstname)
-        else:
-            copy2(srcname, dstname)
-
-    try:
-        shutil.copystat(src, dst)
-    except OSError as e:
-        if e.errno != errno.EPERM:
-            raise
-
 def shell_escape(glob_pat):
     # TODO: handle all cases
     assert not re.compile(r"[][*?]").findall(glob_pat)
     return glob_pat.replace('{', '[{]').replace('}', '[}]')
-
-def shell_to_regex(pat):
-    """Translate a shell PATTERN to a regular expression.
-
-    Based on fnmatch.translate(). We also handle {a,b,c} where fnmatch does not.
-    """
-
-    i, n = 0, len(pat)
-    res = ''
-    while i < n:
-        c = pat[i]
-        i += 1
-        if c == '\\':
-            try:
-                c = pat[i]
-            except IndexError:
-                pass
-            else:
-                i += 1
-                res += re.escape(c)
-        elif c == '*':
-            res += '.*'
-        elif c == '?':
-            res += '.'
-        elif c == '[':
-            try:
-                j = pat.index(']', i)
-            except ValueError:
-                res += r'\['
-            else:
-                stuff = pat[i:j]
-                i = j+1
-                if stuff[0] == '!':
-                    stuff = '^%s' % stuff[1:]
-                elif stuff[0] == '^':
-                    stuff = r'\^%s' % stuff[1:]
-                res += '[%s]' % stuff
-        elif c == '{':
-            try:
-                j = pat.index('}', i)
-            except ValueError:
-                res += '\\{'
-            else:
-                stuff = pat[i:j]
-                i = j+1
-                res += '(%s)' % "|".join([shell_to_regex(p)[:-1] for p in stuff.split(",")])
-        else:
-            res += re.escape(c)
-    return res + "$"
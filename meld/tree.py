@@ -117,11 +117,25 @@ class DiffTreeStore(Gtk.TreeStore):
     def column_index(self, col, pane):
         return self.ntree * col + pane
 
-    def add_entries(self, parent, names):
-        child = self.append(parent)
+    def add_entries(self, parent, names, values=None, position=-1):
+        """Add a row for the paths in 'names' under 'parent'
+
+        'values' is an optional dictionary of column values to set on the
+        new row. The row is inserted with all of its values at once, so
+        that views only see a single row-inserted signal.
+        """
+        values = dict(values) if values else {}
         for pane, path in enumerate(names):
-            self.set_value(child, self.column_index(COL_PATH, pane), path)
-        return child
+            values[self.column_index(COL_PATH, pane)] = path
+        # As in TreeStore.insert(), None values are left unset rather than
+        # converted, which would warn.
+        columns, converted = [], []
+        for column, value in values.items():
+            if value is None:
+                continue
+            columns.append(column)
+            converted.append(self._convert_value(column, value))
+        return self.insert_with_values(parent, position, columns, converted)
 
     def add_empty(self, parent, text="empty folder"):
         it = self.append(parent)
@@ -129,8 +143,8 @@ class DiffTreeStore(Gtk.TreeStore):
             self.set_value(it, self.column_index(COL_PATH, pane), None)
             self.set_state(it, pane, STATE_EMPTY, text)
 
-    def add_error(self, parent, msg, pane):
-        it = self.append(parent)
+    def add_error(self, parent, msg, pane, position=-1):
+        it = self.insert(parent, position)
         for i in range(self.ntree):
             self.set_value(it, self.column_index(COL_STATE, i),
                            str(STATE_ERROR))
@@ -138,25 +152,37 @@ class DiffTreeStore(Gtk.TreeStore):
 
     def set_path_state(self, it, pane, state, isdir=0):
         fullname = self.get_value(it, self.column_index(COL_PATH,pane))
-        name = GLib.markup_escape_text(os.path.basename(fullname))
-        self.set_state(it, pane, state, name, isdir)
+        self.set(it, self.path_state_values(fullname, pane, state, isdir))
+
+    def path_state_values(self, path, pane, state, isdir=0):
+        """Get the column values showing 'path' in the given state
+
+        The returned dictionary can be passed to set() or add_entries(),
+        to update several columns with a single row-changed signal.
+        """
+        name = GLib.markup_escape_text(os.path.basename(path))
+        return self.state_values(pane, state, name, isdir)
 
     def set_state(self, it, pane, state, label, isdir=0):
+        self.set(it, self.state_values(pane, state, label, isdir))
+
+    def state_values(self, pane, state, label, isdir=0):
         col_idx = self.column_index
         icon = self.icon_details[state][1 if isdir else 0]
         tint = self.icon_details[state][3 if isdir else 2]
-        self.set_value(it, col_idx(COL_STATE, pane), str(state))
-        self.set_value(it, col_idx(COL_TEXT,  pane), label)
-        self.set_value(it, col_idx(COL_ICON,  pane), icon)
-        # FIXME: This is horrible, but EmblemCellRenderer crashes
-        # if you try to give it a Gdk.Color property
-        self.set_value(it, col_idx(COL_TINT,  pane), tint)
-
         fg, style, weight, strike = self.text_attributes[state]
-        self.set_value(it, col_idx(COL_FG, pane), fg)
-        self.set_value(it, col_idx(COL_STYLE, pane), style)
-        self.set_value(it, col_idx(COL_WEIGHT, pane), weight)
-        self.set_value(it, col_idx(COL_STRIKE, pane), strike)
+        return {
+            col_idx(COL_STATE, pane): str(state),
+            col_idx(COL_TEXT, pane): label,
+            col_idx(COL_ICON, pane): icon,
+            # FIXME: This is horrible, but EmblemCellRenderer crashes
+            # if you try to give it a Gdk.Color property
+            col_idx(COL_TINT, pane): tint,
+            col_idx(COL_FG, pane): fg,
+            col_idx(COL_STYLE, pane): style,
+            col_idx(COL_WEIGHT, pane): weight,
+            col_idx(COL_STRIKE, pane): strike,
+        }
 
     def get_state(self, it, pane):
         STATE = self.column_index(COL_STATE, pane)
@@ -30,6 +30,7 @@ import tempfile
 import time
 
 from meld import misc
+from meld.filters import shell_to_regex
 from . import _vc
 
 log = logging.getLogger(__name__)
@@ -229,7 +230,7 @@ class Vc(_vc.Vc):
 
         if len(ignored):
             try:
-                regexes = [misc.shell_to_regex(i)[:-1] for i in ignored]
+                regexes = [shell_to_regex(i)[:-1] for i in ignored]
                 ignore_re = re.compile("(" + "|".join(regexes) + ")")
             except re.error as err:
                 log.warning(
@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+"""Benchmarks for Meld's comparison internals
+
+Run from the top-level source directory with:
+
+    python test/benchmark.py [options] [BENCHMARK...]
+
+Each benchmark is run several times, and its best and median times are
+reported. Corpora are generated from fixed seeds or taken from Meld's own
+source, so results from different runs are comparable. Use --json to save
+results, and --compare to check a later run against saved results.
+
+Benchmarks of the Differ and Merger need GObject, and are skipped if it
+isn't available.
+"""
+
+from __future__ import print_function
+
+import atexit
+import collections
+import glob
+import json
+import optparse
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+topdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, topdir)
+
+import meld.conf
+if meld.conf._ is None:
+    meld.conf._ = lambda s: s
+    meld.conf.ngettext = lambda s, p, n: s if n == 1 else p
+
+
+# Multiplier for generated corpus sizes, set from the command line
+scale = 1.0
+
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(func):
+    """Register a benchmark
+
+    Benchmark functions return a setup function and a run function. Only
+    run is timed; it's passed whatever setup returns, and setup is called
+    again before each run.
+    """
+    BENCHMARKS[func.__name__[len("bench_"):]] = func
+    return func
+
+
+def scaled(n):
+    return max(1, int(n * scale))
+
+
+def _run_iter(task):
+    result = None
+    for result in task:
+        pass
+    return result
+
+
+################################################################################
+#
+# Corpora
+#
+################################################################################
+
+WORDS = (
+    "self", "return", "if", "else", "for", "in", "while", "def", "class",
+    "import", "None", "True", "False", "value", "result", "index", "text",
+    "line", "chunk", "buffer", "start", "end", "len", "range", "append",
+    "=", "==", "+", "-", "(", ")", ":", ",", "[", "]", "0", "1", "2",
+)
+
+
+def synthetic_lines(count, seed=0):
+    """Generate lines resembling indented source code"""
+    rng = random.Random(seed)
+    lines = []
+    indent = 0
+    for i in range(count):
+        indent = max(0, min(4, indent + rng.choice((-1, 0, 0, 0, 1))))
+        if rng.random() < 0.1:
+            lines.append("")
+            continue
+        words = [rng.choice(WORDS) for j in range(rng.randint(2, 10))]
+        lines.append("    " * indent + " ".join(words))
+    return lines
+
+
+def source_lines():
+    """Get a realistic corpus, from the lines of Meld's own source"""
+    lines = []
+    for path in sorted(glob.glob(os.path.join(topdir, "meld", "*.py"))):
+        with open(path) as f:
+            lines.extend(f.read().splitlines())
+    return lines
+
+
+def edit_lines(lines, edits, seed=0):
+    """Make single-line insertions, deletions and replacements"""
+    rng = random.Random(seed)
+    lines = list(lines)
+    for i in range(edits):
+        pos = rng.randrange(len(lines))
+        op = rng.choice("idr")
+        if op == "i":
+            lines.insert(pos, "inserted line %d" % i)
+        elif op == "d":
+            del lines[pos]
+        else:
+            lines[pos] = lines[pos] + " # changed %d" % i
+    return lines
+
+
+def move_blocks(lines, blocks, size, seed=0):
+    """Move blocks of lines to other places in the file"""
+    rng = random.Random(seed)
+    lines = list(lines)
+    for i in range(blocks):
+        start = rng.randrange(len(lines) - size)
+        block = lines[start:start + size]
+        del lines[start:start + size]
+        pos = rng.randrange(len(lines))
+        lines[pos:pos] = block
+    return lines
+
+
+def conflicting_texts(lines, edits, seed=0):
+    """Get local, base and remote texts, with around half of edits conflicting
+    """
+    rng = random.Random(seed)
+    local, remote = list(lines), list(lines)
+    for i in range(edits):
+        pos = rng.randrange(len(lines))
+        local[pos] = "local change %d" % i
+        if rng.random() >= 0.5:
+            pos = rng.randrange(len(lines))
+        remote[pos] = "remote change %d" % i
+    return [local, list(lines), remote]
+
+
+def build_tree(root, depth, width, files, change=0.0, seed=0):
+    """Create a folder tree of small files
+
+    Each folder down to depth has width subfolders and files files. If
+    change is given, that proportion of files has a line changed.
+    """
+    rng = random.Random(seed)
+    todo = [(root, 0)]
+    while todo:
+        folder, level = todo.pop()
+        os.makedirs(folder)
+        for i in range(files):
+            lines = synthetic_lines(50, seed=level * files + i)
+            if rng.random() < change:
+                lines[rng.randrange(len(lines))] = "changed"
+            with open(os.path.join(folder, "file%d.py" % i), "w") as f:
+                f.write("\n".join(lines) + "\n")
+        if level < depth:
+            for i in range(width):
+                todo.append((os.path.join(folder, "dir%d" % i), level + 1))
+
+
+_trees = None
+
+
+def folder_trees():
+    """Get two deep, slightly different folder trees
+
+    The trees are created once, and removed on exit. Comparisons are
+    cached in memory only, so that the user's comparison cache is left
+    alone, and so that it can't make later runs faster.
+    """
+    global _trees
+    if _trees is None:
+        from meld import dircache, dircompare
+        dircompare._cache = dircache.ComparisonCache(
+            None, dircompare.CacheResult, dircompare.StatItem)
+
+        tempdir = tempfile.mkdtemp(prefix="meld-benchmark-")
+        atexit.register(shutil.rmtree, tempdir, True)
+        depth = 5 if scale >= 1 else 3
+        _trees = [os.path.join(tempdir, "left"),
+                  os.path.join(tempdir, "right")]
+        build_tree(_trees[0], depth, 3, 8)
+        build_tree(_trees[1], depth, 3, 8, change=0.1)
+    return _trees
+
+
+def folder_comparison_args(**args):
+    comparison_args = {
+        'shallow-comparison': False,
+        'digest-comparison': False,
+        'time-resolution': 100,
+        'ignore_blank_lines': False,
+    }
+    comparison_args.update(args)
+    return comparison_args
+
+
+################################################################################
+#
+# Benchmarks
+#
+################################################################################
+
+def _matcher_benchmark(a, b):
+    from meld.matchers import MyersSequenceMatcher
+
+    def setup():
+        return MyersSequenceMatcher(None, a, b)
+
+    def run(matcher):
+        matcher.get_opcodes()
+    return setup, run
+
+
+@benchmark
+def bench_myers_large_file():
+    a = synthetic_lines(scaled(50000))
+    return _matcher_benchmark(a, edit_lines(a, scaled(50)))
+
+
+@benchmark
+def bench_myers_small_edits():
+    a = synthetic_lines(scaled(10000))
+    return _matcher_benchmark(a, edit_lines(a, scaled(500)))
+
+
+@benchmark
+def bench_myers_moved_blocks():
+    a = synthetic_lines(scaled(10000))
+    return _matcher_benchmark(a, move_blocks(a, scaled(20), 50))
+
+
+@benchmark
+def bench_myers_source():
+    a = source_lines()
+    b = move_blocks(edit_lines(a, scaled(200)), scaled(5), 30)
+    return _matcher_benchmark(a, b)
+
+
+@benchmark
+def bench_inline_myers():
+    from meld.matchers import InlineMyersSequenceMatcher
+
+    # Inline highlighting compares the text of changed chunks
+    a = source_lines()
+    b = edit_lines(a, len(a) // 5)
+    pairs = []
+    for i in range(0, min(len(a), len(b), scaled(20000)), 10):
+        pairs.append(("\n".join(a[i:i + 10]), "\n".join(b[i:i + 10])))
+
+    def setup():
+        return pairs
+
+    def run(pairs):
+        for text1, text2 in pairs:
+            InlineMyersSequenceMatcher(None, text1, text2).get_opcodes()
+    return setup, run
+
+
+@benchmark
+def bench_differ_two_way():
+    from meld.diffutil import Differ
+
+    a = source_lines()
+    texts = [a, edit_lines(a, scaled(500))]
+
+    def run(differ):
+        _run_iter(differ.set_sequences_iter(texts))
+    return Differ, run
+
+
+@benchmark
+def bench_differ_three_way():
+    from meld.diffutil import Differ
+
+    texts = conflicting_texts(synthetic_lines(scaled(20000)), scaled(300))
+
+    def run(differ):
+        _run_iter(differ.set_sequences_iter(texts))
+    return Differ, run
+
+
+@benchmark
+def bench_change_sequence():
+    from meld.diffutil import Differ
+
+    texts = conflicting_texts(synthetic_lines(scaled(10000)), scaled(100))
+    rng = random.Random(0)
+    edits = [rng.randrange(len(texts[0])) for i in range(200)]
+
+    def setup():
+        differ = Differ()
+        current = [list(t) for t in texts]
+        _run_iter(differ.set_sequences_iter(current))
+        return differ, current
+
+    def run(state):
+        # Insert lines in the first pane, one at a time as when typing
+        differ, current = state
+        for i, line in enumerate(edits):
+            current[0].insert(line, "typed line %d" % i)
+            differ.change_sequence(0, line, 1, current)
+    return setup, run
+
+
+@benchmark
+def bench_merge_three_files():
+    from meld.merge import Merger
+
+    texts = conflicting_texts(synthetic_lines(scaled(20000)), scaled(300))
+
+    def setup():
+        merger = Merger()
+        _run_iter(merger.initialize(texts, texts))
+        return merger
+
+    def run(merger):
+        _run_iter(merger.merge_3_files())
+    return setup, run
+
+
+def _files_same_benchmark(regexes=(), **args):
+    from meld import dircompare
+
+    roots = folder_trees()
+    pairs = []
+    for dirpath, dirnames, filenames in os.walk(roots[0]):
+        other = os.path.join(roots[1], os.path.relpath(dirpath, roots[0]))
+        for name in filenames:
+            pairs.append(
+                [os.path.join(dirpath, name), os.path.join(other, name)])
+    comparison_args = folder_comparison_args(**args)
+
+    def setup():
+        dircompare._cache.clear()
+        dircompare._digest_cache.clear()
+
+    def run(state):
+        for files in pairs:
+            dircompare.files_same(files, regexes, comparison_args)
+    return setup, run
+
+
+@benchmark
+def bench_files_same():
+    return _files_same_benchmark()
+
+
+@benchmark
+def bench_files_same_filtered():
+    return _files_same_benchmark([re.compile(r"#.*")])
+
+
+@benchmark
+def bench_files_same_shallow():
+    return _files_same_benchmark(**{'shallow-comparison': True})
+
+
+@benchmark
+def bench_compare_folders():
+    from meld import dircompare
+
+    roots = folder_trees()
+    comparison_args = folder_comparison_args()
+
+    def setup():
+        dircompare._cache.clear()
+        return dircompare.ComparisonPool()
+
+    def run(pool):
+        for entry in dircompare.compare_folders(
+                roots, comparison_args, pool=pool):
+            pass
+    return setup, run
+
+
+@benchmark
+def bench_shallow_equal():
+    from meld.dircompare import StatItem
+
+    rng = random.Random(0)
+    pairs = []
+    for i in range(scaled(10 ** 6)):
+        size = rng.randint(0, 1 << 20)
+        mtime = 1400000000 + rng.random() * 10 ** 6
+        other_mtime = mtime
+        if rng.random() < 0.5:
+            other_mtime += rng.choice((1e-7, 0.5, 1.5, 3.0))
+        first = os.stat_result((0o100644, i, 0, 1, 0, 0, size, 0, mtime, 0))
+        second = os.stat_result(
+            (0o100644, i, 0, 1, 0, 0, size, 0, other_mtime, 0))
+        pairs.append((first, second))
+
+    def setup():
+        return pairs
+
+    def run(pairs):
+        # Converting stat results is part of every shallow comparison
+        for a, b in pairs:
+            StatItem._make(a).shallow_equal(StatItem._make(b), 100)
+    return setup, run
+
+
+################################################################################
+#
+# Running and reporting
+#
+################################################################################
+
+def run_benchmark(name, repeat):
+    """Run a benchmark, returning its timings or None if it was skipped"""
+    try:
+        setup, run = BENCHMARKS[name]()
+    except ImportError as err:
+        print("Skipping %s: %s" % (name, err), file=sys.stderr)
+        return None
+
+    times = []
+    for i in range(repeat):
+        state = setup()
+        start = time.time()
+        run(state)
+        times.append(time.time() - start)
+    times.sort()
+    return collections.OrderedDict([
+        ("best", times[0]),
+        ("median", times[len(times) // 2]),
+        ("times", times),
+    ])
+
+
+def compare_results(old, new):
+    """Print the change in best times from old results to new ones"""
+    print("%-24s %10s %10s %8s" % ("benchmark", "old", "new", "change"))
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        old_best = old["results"][name]["best"]
+        change = (result["best"] - old_best) / old_best * 100
+        print("%-24s %10.4f %10.4f %+7.1f%%" % (
+            name, old_best, result["best"], change))
+
+
+def main():
+    global scale
+
+    parser = optparse.OptionParser(
+        usage="%prog [options] [BENCHMARK...]",
+        description="Available benchmarks: " + ", ".join(BENCHMARKS))
+    parser.add_option(
+        "-r", "--repeat", type="int", default=5,
+        help="Number of times to run each benchmark")
+    parser.add_option(
+        "-s", "--scale", type="float", default=1.0,
+        help="Multiplier for the size of generated corpora")
+    parser.add_option(
+        "--json", metavar="FILE",
+        help="Write results as JSON to FILE, or to stdout for '-'")
+    parser.add_option(
+        "--compare", metavar="FILE",
+        help="Compare results with JSON results saved in FILE")
+    options, names = parser.parse_args()
+
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("Unknown benchmark %s" % name)
+    scale = options.scale
+
+    output = collections.OrderedDict([
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("repeat", options.repeat),
+        ("scale", options.scale),
+        ("results", collections.OrderedDict()),
+    ])
+    for name in names or BENCHMARKS:
+        result = run_benchmark(name, options.repeat)
+        if result is None:
+            continue
+        output["results"][name] = result
+        if options.json != "-":
+            print("%-24s best %.4fs, median %.4fs" % (
+                name, result["best"], result["median"]))
+
+    if options.json == "-":
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        with open(options.json, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if options.compare:
+        with open(options.compare) as f:
+            compare_results(json.load(f), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+from meld import dircache
+
+
+Result = collections.namedtuple("Result", "stats result")
+Stat = collections.namedtuple("Stat", "mode size mtime")
+
+
+def key(i):
+    return (("a%d" % i, "b%d" % i), (), False)
+
+
+def value(i):
+    return Result((Stat(0o100644, i, 1), Stat(0o100644, i, 2)), i % 6)
+
+
+class ComparisonCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "sub", "cache.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def cache(self, **kwargs):
+        path = kwargs.pop("path", self.path)
+        return dircache.ComparisonCache(path, Result, Stat, **kwargs)
+
+    def testMemoryOnly(self):
+        cache = self.cache(path=None, max_entries=3)
+        for i in range(5):
+            cache[key(i)] = value(i)
+        # Looking up an entry makes it the most recently used
+        self.assertEqual(cache.get(key(2)), value(2))
+        cache[key(5)] = value(5)
+        self.assertEqual(cache.get(key(0)), None)
+        self.assertEqual(cache.get(key(3)), None)
+        self.assertEqual(cache.get(key(2)), value(2))
+        self.assertEqual(cache.get(key(5)), value(5))
+        cache.flush()
+        self.assertFalse(os.path.exists(self.path))
+
+    def testStoredBetweenSessions(self):
+        cache = self.cache()
+        for i in range(10):
+            cache[key(i)] = value(i)
+        cache.flush()
+
+        cache = self.cache()
+        self.assertEqual(cache.get(key(3)), value(3))
+        self.assertEqual(cache.get(key(10)), None)
+
+    def testPreload(self):
+        cache = self.cache()
+        for i in range(0, 1200, 2):
+            cache[key(i)] = value(i)
+        cache.flush()
+
+        cache = self.cache()
+        cache.preload([key(i) for i in range(1200)])
+        self.assertEqual(len(cache.entries), 600)
+        self.assertEqual(len(cache.absent), 600)
+        self.assertEqual(cache.get(key(8)), value(8))
+        self.assertEqual(cache.get(key(9)), None)
+        cache[key(9)] = value(9)
+        self.assertEqual(cache.get(key(9)), value(9))
+
+    def testPrune(self):
+        cache = self.cache(max_stored_entries=5)
+        for i in range(10):
+            cache[key(i)] = value(i)
+        cache.flush()
+        cache.flush(prune=True)
+
+        cache = self.cache()
+        cache.preload([key(i) for i in range(10)])
+        self.assertEqual(len(cache.entries), 5)
+
+    def testUnwritableDatabase(self):
+        os.mkdir(os.path.dirname(self.path))
+        os.mkdir(self.path)
+        cache = self.cache()
+        cache[key(1)] = value(1)
+        cache.flush()
+        self.assertEqual(cache.get(key(1)), value(1))
+        self.assertEqual(cache.get(key(2)), None)
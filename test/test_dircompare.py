@@ -0,0 +1,160 @@
+
+import io
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from meld import dircompare
+
+
+COMPARISON_ARGS = {
+    'shallow-comparison': False,
+    'digest-comparison': False,
+    'time-resolution': 100,
+    'ignore_blank_lines': False,
+}
+
+
+def write_tree(root, spec):
+    """Create files from a dict of relative paths to contents
+
+    Paths with contents of None are created as empty folders.
+    """
+    for path, contents in spec.items():
+        full = os.path.join(root, path)
+        if contents is None:
+            os.makedirs(full)
+            continue
+        if not os.path.isdir(os.path.dirname(full)):
+            os.makedirs(os.path.dirname(full))
+        with io.open(full, "wb") as f:
+            f.write(contents)
+
+
+class CompareFoldersTests(unittest.TestCase):
+
+    def setUp(self):
+        dircompare._cache.disable_storage()
+        self.tmp = tempfile.mkdtemp()
+        self.roots = [os.path.join(self.tmp, n) for n in ("a", "b")]
+        for root in self.roots:
+            os.mkdir(root)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def compare(self, a, b, regexes=(), **args):
+        write_tree(self.roots[0], a)
+        write_tree(self.roots[1], b)
+        comparison_args = dict(COMPARISON_ARGS, **args)
+        entries = dircompare.compare_folders(
+            self.roots, comparison_args, regexes)
+        return dict((e.path, (e.kind, e.present, e.state)) for e in entries)
+
+    def testStates(self):
+        entries = self.compare(
+            {"same": b"x", "diff": b"a", "onlya": b"1", "sub/s": b"q",
+             "empty": None},
+            {"same": b"x", "diff": b"b", "onlyb": b"1", "sub/s": b"q",
+             "empty": None})
+        self.assertEqual(entries, {
+            "same": ("file", (True, True), dircompare.STATE_SAME),
+            "diff": ("file", (True, True), dircompare.STATE_MODIFIED),
+            "onlya": ("file", (True, False), dircompare.STATE_NEW),
+            "onlyb": ("file", (False, True), dircompare.STATE_NEW),
+            "sub": ("folder", (True, True), dircompare.STATE_SAME),
+            os.path.join("sub", "s"):
+                ("file", (True, True), dircompare.STATE_SAME),
+            "empty": ("folder", (True, True), dircompare.STATE_SAME),
+        })
+
+    def testTextFilters(self):
+        regexes = [re.compile(b"[0-9]+")]
+        entries = self.compare(
+            {"f": b"version 1\nsame\n", "g": b"a\n"},
+            {"f": b"version 22\nsame\n", "g": b"b\n"}, regexes)
+        self.assertEqual(entries["f"][2], dircompare.STATE_SAME_FILTERED)
+        self.assertEqual(entries["g"][2], dircompare.STATE_MODIFIED)
+
+    def testIgnoreBlankLines(self):
+        entries = self.compare(
+            {"f": b"a\n\nb\n"}, {"f": b"a\nb\n\n\n"}, ignore_blank_lines=True)
+        self.assertEqual(entries["f"][2], dircompare.STATE_SAME_FILTERED)
+
+    def testFolderFileClash(self):
+        entries = self.compare({"x/inner": b"1"}, {"x": b"1"})
+        self.assertEqual(entries, {
+            "x": ("folder", (True, True), dircompare.STATE_MODIFIED),
+        })
+
+    def testDanglingSymlinkIsError(self):
+        os.symlink(os.path.join(self.tmp, "missing"),
+                   os.path.join(self.roots[1], "link"))
+        entries = list(dircompare.compare_folders(
+            self.roots, COMPARISON_ARGS))
+        self.assertEqual(
+            [(e.path, e.kind, e.present, e.state) for e in entries],
+            [("", "error", (False, True), dircompare.STATE_ERROR)])
+
+
+class ContentsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def contents_same(self, *contents):
+        files = []
+        for i, data in enumerate(contents):
+            path = os.path.join(self.tmp, str(i))
+            with io.open(path, "wb") as f:
+                f.write(data)
+            files.append(path)
+        stats = [os.stat(f) for f in files]
+        return dircompare._contents_same(files, stats)
+
+    def testContentsSame(self):
+        block = dircompare.LARGE_CHUNK_SIZE
+        self.assertEqual(self.contents_same(b"", b""), dircompare.Same)
+        self.assertEqual(
+            self.contents_same(b"x" * block * 2, b"x" * block * 2),
+            dircompare.Same)
+        self.assertEqual(
+            self.contents_same(b"x" * block + b"y", b"x" * block + b"z"),
+            dircompare.Different)
+        self.assertEqual(
+            self.contents_same(b"abc", b"abc", b"abd"), dircompare.Different)
+
+    def testStreamsSame(self):
+        same = dircompare._streams_same
+        self.assertTrue(same([iter(["ab", "c"]), iter(["a", "bc"])]))
+        self.assertTrue(same([iter([]), iter([])]))
+        self.assertFalse(same([iter(["ab"]), iter(["a", "b", "c"])]))
+        self.assertFalse(same([iter(["abc"]), iter(["abd"])]))
+
+
+class CanonicalListingTests(unittest.TestCase):
+
+    def listing(self, panes, canonicalize=None):
+        listing = dircompare.CanonicalListing(len(panes), canonicalize)
+        for pane, names in enumerate(panes):
+            for name in names:
+                listing.add(pane, name)
+        return listing
+
+    def testMatching(self):
+        listing = self.listing([["b", "a", "c"], ["c", "d", "a"]])
+        self.assertEqual(listing.get(), [
+            ("a", "a"), ("b", "b"), ("c", "c"), ("d", "d")])
+        self.assertEqual(listing.errors, [])
+
+    def testCaseInsensitive(self):
+        lower = lambda s: s.lower()
+        listing = self.listing([["a", "B"], ["A", "c", "C"]], lower)
+        # Rows are sorted by name, not by the folded names matched on
+        self.assertEqual(listing.get(), [("B", "B"), ("a", "A"), ("c", "c")])
+        self.assertEqual(listing.errors, [(1, "C", "c")])
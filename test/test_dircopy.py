@@ -0,0 +1,63 @@
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from meld import dircopy
+
+
+class CopyFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, "src")
+        self.dst = os.path.join(self.tmp, "dst")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, path, data):
+        with io.open(path, "wb") as f:
+            f.write(data)
+
+    def read(self, path):
+        with io.open(path, "rb") as f:
+            return f.read()
+
+    def testCopy(self):
+        data = os.urandom(dircopy.COPY_CHUNK_SIZE + 123)
+        self.write(self.src, data)
+        os.utime(self.src, (1000000000, 1000000000))
+        self.assertEqual(dircopy.copy_file(self.src, self.dst), len(data))
+        self.assertEqual(self.read(self.dst), data)
+        self.assertTrue(
+            dircopy._is_copied(os.stat(self.src), os.stat(self.dst)))
+
+    def testCopyEmpty(self):
+        self.write(self.src, b"")
+        self.write(self.dst, b"old contents")
+        self.assertEqual(dircopy.copy_file(self.src, self.dst), 0)
+        self.assertEqual(self.read(self.dst), b"")
+
+    def testSkipCopied(self):
+        self.write(self.src, b"new")
+        self.write(self.dst, b"old")
+        os.utime(self.src, (1000000000, 1000000000))
+        # An interrupted copy doesn't have its source's mtime
+        self.assertFalse(
+            dircopy._is_copied(os.stat(self.src), os.stat(self.dst)))
+        self.assertEqual(dircopy.copy_file(self.src, self.dst, True), 3)
+        self.assertEqual(dircopy.copy_file(self.src, self.dst, True), 0)
+        self.assertEqual(self.read(self.dst), b"new")
+
+    def testCopySymlink(self):
+        os.symlink("target", self.src)
+        self.write(self.dst, b"old")
+        self.assertEqual(dircopy.copy_file(self.src, self.dst), 0)
+        self.assertEqual(os.readlink(self.dst), "target")
+
+    def testCopyFolderFails(self):
+        os.mkdir(self.src)
+        self.assertRaises(OSError, dircopy.copy_file, self.src, self.dst)
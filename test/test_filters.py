@@ -0,0 +1,49 @@
+
+import random
+import unittest
+
+from meld import filters
+
+
+class NameFilterMatcherTests(unittest.TestCase):
+
+    def assertMatchesLikeFilters(self, patterns, names):
+        matcher = filters.NameFilterMatcher(patterns)
+        compiled = [filters.FilterEntry.compile_filter(
+            p, filters.FilterEntry.SHELL) for p in patterns]
+        for name in names:
+            expected = any(c.match(name) is not None for c in compiled if c)
+            self.assertEqual(matcher.match(name), expected,
+                             "%r with %r" % (name, patterns))
+
+    def testBasicPatterns(self):
+        patterns = ["*.pyc *.pyo", "CVS .svn", "build*", "*~ .#*", "[Tt]mp?"]
+        names = ["a.pyc", "a.py", "CVS", "CVSROOT", ".svn", "builder",
+                 "rebuild", "x~", ".#x", "Tmp1", "tmp", "tmp12", ".pyc"]
+        self.assertMatchesLikeFilters(patterns, names)
+
+    def testBracePatterns(self):
+        patterns = ["*.{o,a} lib{foo,bar}.so"]
+        names = ["x.o", "x.a", "x.so", "libfoo.so", "libbaz.so", "libbar.so"]
+        self.assertMatchesLikeFilters(patterns, names)
+
+    def testRandomPatterns(self):
+        rand = random.Random(0)
+        alphabet = "ab."
+        bits = ["*", "?", "[ab]", "[!a]", "{a,b.}"]
+
+        def random_name():
+            return "".join(rand.choice(alphabet)
+                           for i in range(rand.randint(1, 5)))
+
+        def random_glob():
+            return "".join(rand.choice(alphabet) if rand.random() < 0.6
+                           else rand.choice(bits)
+                           for i in range(rand.randint(1, 4)))
+
+        names = [random_name() for i in range(100)]
+        for i in range(200):
+            patterns = [" ".join(random_glob()
+                                 for j in range(rand.randint(1, 3)))
+                        for k in range(rand.randint(1, 3))]
+            self.assertMatchesLikeFilters(patterns, names)
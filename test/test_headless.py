@@ -0,0 +1,136 @@
+
+import io
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import meld.conf
+from meld import headless
+
+# Translations are normally set up by bin/meld
+if meld.conf._ is None:
+    meld.conf._ = lambda message: message
+
+
+def have_command(command):
+    try:
+        with open(os.devnull, "wb") as devnull:
+            subprocess.call([command, "--version"], stdout=devnull,
+                            stderr=devnull)
+    except OSError:
+        return False
+    return True
+
+
+class HeadlessTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp, name)
+        with io.open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def read(self, path):
+        with io.open(path, "rb") as f:
+            return f.read()
+
+    def headless_diff(self, a, b, context=3):
+        files = [self.write("a", a), self.write("b", b)]
+        stdout, sys.stdout = sys.stdout, io.BytesIO()
+        try:
+            status = headless.main(
+                ["--headless-diff", "-U", str(context)] + files)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        return status, output
+
+    def headless_merge(self, local, base, remote):
+        files = [self.write("local", local), self.write("base", base),
+                 self.write("remote", remote)]
+        output = os.path.join(self.tmp, "output")
+        status = headless.main(["--headless-merge", "-o", output] + files)
+        return status, self.read(output)
+
+    def testDiffLikeDiffUtils(self):
+        if not have_command("diff"):
+            self.skipTest("diff isn't available")
+        cases = [
+            (b"a\nb\nc\n", b"a\nB\nc\n"),
+            (b"".join(b"%d\n" % i for i in range(20)),
+             b"".join(b"%d\n" % i for i in range(20) if i not in (3, 15))),
+            (b"a\nb\n", b"a\nb\nc\nd\n"),
+            (b"a\nb", b"a\nc"),
+            (b"", b"new\n"),
+        ]
+        for a, b in cases:
+            status, output = self.headless_diff(a, b)
+            process = subprocess.Popen(
+                ["diff", "-u", os.path.join(self.tmp, "a"),
+                 os.path.join(self.tmp, "b")], stdout=subprocess.PIPE)
+            expected = process.communicate()[0]
+            self.assertEqual(status, process.returncode)
+            # The headers have timestamps, so only the hunks are compared
+            self.assertEqual(output.split(b"\n", 2)[2],
+                             expected.split(b"\n", 2)[2])
+
+    def testDiffSame(self):
+        self.assertEqual(self.headless_diff(b"a\nb\n", b"a\nb\n"), (0, b""))
+
+    def testDiffAppliesWithPatch(self):
+        if not have_command("patch"):
+            self.skipTest("patch isn't available")
+        rand = random.Random(0)
+        for i in range(50):
+            a = [rand.choice(b"abcdefg") for j in range(rand.randint(0, 30))]
+            b = list(a)
+            for j in range(rand.randint(1, 6)):
+                if b and rand.random() < 0.3:
+                    del b[rand.randrange(len(b))]
+                else:
+                    b.insert(rand.randint(0, len(b)), rand.choice(b"xyz"))
+            old = b"\n".join(a) + rand.choice([b"\n", b""])
+            new = b"\n".join(b) + rand.choice([b"\n", b""])
+            status, output = self.headless_diff(old, new, i % 4)
+            patch = self.write("patch", output)
+            with open(os.devnull, "wb") as devnull:
+                subprocess.check_call(
+                    ["patch", "-s", os.path.join(self.tmp, "a"), patch],
+                    stdout=devnull)
+            self.assertEqual(self.read(os.path.join(self.tmp, "a")), new)
+
+    def testMerge(self):
+        status, merged = self.headless_merge(
+            b"a\nB\nc\nd\n", b"a\nb\nc\nd\n", b"a\nb\nc\nD\n")
+        self.assertEqual((status, merged), (0, b"a\nB\nc\nD\n"))
+
+    def testMergeConflict(self):
+        # Conflicts are marked and keep the base text, as in file merges
+        status, merged = self.headless_merge(b"x\n", b"a\n", b"y\n")
+        self.assertEqual((status, merged), (1, b"(??)a\n"))
+
+    def testMergeKeepsBaseLineEndings(self):
+        status, merged = self.headless_merge(
+            b"a\r\nB\r\nc\r\n", b"a\r\nb\r\nc\r\n", b"a\r\nb\r\nC\r\n")
+        self.assertEqual((status, merged), (0, b"a\r\nB\r\nC\r\n"))
+
+        status, merged = self.headless_merge(
+            b"a\r\nB\r\nc", b"a\r\nb\r\nc", b"a\r\nb\r\nC")
+        self.assertEqual((status, merged), (0, b"a\r\nB\r\nC"))
+
+    def testLineEnding(self):
+        self.assertEqual(headless.line_ending([]), b"\n")
+        self.assertEqual(headless.line_ending([b"a"]), b"\n")
+        self.assertEqual(
+            headless.line_ending([b"a\r\n", b"b\n", b"c\r\n", b"d"]),
+            b"\r\n")